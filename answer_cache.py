@@ -0,0 +1,139 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Optional, Tuple
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))           # entries, least recently used dropped first
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))           # seconds an answer is reused
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))  # word-bigram Jaccard for near duplicates, 0 = exact only
+
+# dropped before comparing questions; numbers and single letters are kept ("lab 1" is not "lab 2")
+FILLER = frozenset("a an the please can could would you tell me i we is are was what whats how do does about of for to".split())
+# must appear identically, in the same order, for two questions to count as near duplicates
+NUMBER_WORDS = frozenset("""zero one two three four five six seven eight nine ten eleven twelve first second third fourth
+fifth sixth seventh eighth ninth tenth eleventh twelfth last next previous final""".split())
+_NUMBER = re.compile(r"\d")
+
+Signature = Tuple[Tuple[str, ...], FrozenSet[Tuple[str, str]]]  # (numbers in order, word bigrams)
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", question.lower().replace("'", "")))
+
+
+def _signature(normalized: str) -> Signature:
+    """What near-duplicate matching compares: the question's numbers and ordinals in order, and its
+    consecutive word pairs (filler dropped), so reordering "4 ... than 3" changes the signature."""
+    words = ["^"] + [w for w in normalized.split() if w not in FILLER] + ["$"]
+    numbers = tuple(w for w in words if w in NUMBER_WORDS or _NUMBER.search(w))
+    return numbers, frozenset(zip(words, words[1:]))
+
+
+class AnswerCache:
+    """/chat answers keyed by (normalized question, context version), with TTL and LRU eviction.
+
+    With similarity > 0, a miss whose question is a near duplicate of a cached one (same context
+    version, same numbers and ordinals in the same order, word-bigram Jaccard >= similarity) reuses
+    that answer. Identical questions arriving while the first one is still
+    being answered wait for it instead of calling the model again."""
+    def __init__(self, size: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL,
+                 similarity: float = ANSWER_CACHE_SIMILARITY) -> None:
+        self.size = max(1, size)
+        self.ttl = ttl
+        self.similarity = similarity
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, Tuple[float, str, Signature, Any]]" = OrderedDict()  # key -> (stored, version, signature, value)
+        self.inflight: Dict[str, "asyncio.Future[Any]"] = {}
+        self.counts = {"hits": 0, "similar": 0, "coalesced": 0, "misses": 0, "errors": 0}
+
+    @staticmethod
+    def key_for(normalized: str, version: str) -> str:
+        return hashlib.sha256(f"{version}|{normalized}".encode()).hexdigest()
+
+    def _lookup(self, key: str, version: str, sig: Signature) -> Tuple[Optional[str], Any]:
+        """(how, value): how is "hit", "similar" or None."""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.entries.move_to_end(key)
+                return "hit", entry[3]
+            if self.similarity <= 0: return None, None
+            numbers, pairs = sig
+            best, best_key = 0.0, None
+            for k, (stored, ver, (nums, p), _) in self.entries.items():
+                if ver != version or now - stored >= self.ttl or nums != numbers: continue
+                score = len(pairs & p) / len(pairs | p)
+                if score > best: best, best_key = score, k
+            if best_key is not None and best >= self.similarity:
+                self.entries.move_to_end(best_key)
+                return "similar", self.entries[best_key][3]
+            return None, None
+
+    def put(self, key: str, version: str, sig: Signature, value: Any) -> None:
+        with self.lock:
+            self.entries[key] = (time.time(), version, sig, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def lookup(self, question: str, version: str) -> Tuple[Optional[str], Any]:
+        """(how, value) without computing anything; how is "hit", "similar" or None."""
+        normalized = normalize_question(question)
+        how, value = self._lookup(self.key_for(normalized, version), version, _signature(normalized))
+        if how is not None: self.counts["hits" if how == "hit" else "similar"] += 1
+        return how, value
+
+    def store(self, question: str, version: str, value: Any) -> None:
+        normalized = normalize_question(question)
+        self.counts["misses"] += 1
+        self.put(self.key_for(normalized, version), version, _signature(normalized), value)
+
+    async def get_or_compute(self, question: str, version: str, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, str]:
+        """(value, how) with how one of hit / similar / coalesced / miss. A failed compute is not cached
+        and its error reaches every caller that was waiting on it."""
+        normalized = normalize_question(question)
+        key, sig = self.key_for(normalized, version), _signature(normalized)
+        how, value = self._lookup(key, version, sig)
+        if how is not None:
+            self.counts["hits" if how == "hit" else "similar"] += 1
+            return value, how
+        pending = self.inflight.get(key)
+        if pending is not None:
+            self.counts["coalesced"] += 1
+            try:
+                return await asyncio.shield(pending), "coalesced"
+            except asyncio.CancelledError:
+                if not pending.cancelled(): raise  # this caller went away
+                return await self.get_or_compute(question, version, compute)  # the first caller went away
+
+        self.counts["misses"] += 1
+        fut: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+        self.inflight[key] = fut
+        try:
+            value = await compute()
+        except Exception as e:
+            self.counts["errors"] += 1
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved: nobody may be waiting
+            raise
+        else:
+            self.put(key, version, sig, value)
+            fut.set_result(value)
+            return value, "miss"
+        finally:
+            self.inflight.pop(key, None)
+            if not fut.done(): fut.cancel()  # cancelled: waiters retry on their own
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"entries": len(self.entries), "in_flight": len(self.inflight), "ttl": self.ttl,
+                    "similarity": self.similarity, **self.counts}
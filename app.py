@@ -6,13 +6,26 @@ import tempfile
 import zipfile
 import json
 import time
-from typing import List, Dict, Any, Optional, Tuple, Set
-
-import requests
+import hashlib
+import asyncio
+import weakref
+import threading
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit, parse_qs, parse_qsl, urlencode
+from http.cookiejar import DefaultCookiePolicy
+from typing import List, Dict, Any, Optional, Tuple, Set, Callable, Iterable, Iterator, AsyncIterator, Awaitable
+
+import httpx
 from html.parser import HTMLParser
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, FileResponse, PlainTextResponse
+
+from export_jobs import JobManager, ExportJob
+from snapshot_store import SnapshotStore, stamp, diff_stamps
+from blob_cache import BlobCache
+from response_cache import make_response_cache
+from metrics import metrics, Timings, recording
 from fastapi import HTTPException
 
 app = FastAPI(title="Canvas Exporter")
@@ -51,100 +64,191 @@ app.add_middleware(
     max_age=86400,
 )
 
+# ---------------- HTTP connection pool ----------------
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "0"))     # keep-alive connections per host, 0 = sized from the worker settings
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "8"))   # hosts with a cached pool (Canvas API + file CDNs)
+
+def http_pool_size() -> int:
+    """Connections per host: enough for one export's full fan-out (courses x sections x pages, plus
+    the downloads of the course being zipped), so no request has to wait for a connection or close
+    one after use."""
+    return HTTP_POOL_SIZE or EXPORT_WORKERS * SECTION_WORKERS * PAGE_WORKERS + DOWNLOAD_WORKERS
+
+@lru_cache(maxsize=256)
+def auth_headers(token: str) -> Dict[str, str]:
+    # shared per token, callers must not mutate
+    return {"Authorization": f"Bearer {token}"}
+
+# ---------------- Rate-limit governor ----------------
+RATE_LOW_WATER = float(os.getenv("CANVAS_RATE_LOW_WATER", "150"))   # quota kept in reserve per token
+RATE_REFILL_PER_SEC = float(os.getenv("CANVAS_RATE_REFILL", "10"))  # Canvas leaks ~10 units/s back
+RATE_PREFLIGHT_COST = float(os.getenv("CANVAS_RATE_PREFLIGHT", "50"))  # Canvas charges this up front per open request
+RATE_UNKNOWN_CONCURRENCY = int(os.getenv("CANVAS_RATE_UNKNOWN_CONCURRENCY", "4"))  # in flight before any quota is reported
+RATE_RELEASE_POLL = 0.05  # seconds between checks while only in-flight reservations hold a request back
+RATE_LIMIT_RETRIES = 6
+
+class RateGovernor:
+    """Paces one token's requests from Canvas's X-Rate-Limit-Remaining / X-Request-Cost headers.
+    Shared by every export running with that token, so concurrent jobs draw on one budget.
+
+    Canvas takes a pre-flight charge (RATE_PREFLIGHT_COST) from the bucket for every open request and
+    settles it to the real cost when the request ends, so each request in flight reserves that much.
+    Until the first response reports the quota, at most RATE_UNKNOWN_CONCURRENCY requests are open."""
+    def __init__(self) -> None:
+        self.lock = threading.Lock()  # shared by the event loops of concurrent export jobs
+        self.remaining: Optional[float] = None  # last reported quota, None until the first response
+        self.seen_at = 0.0
+        self.avg_cost = 1.0
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.throttle_seconds = 0.0
+        self.rate_limited = 0
+
+    def _reserve(self) -> float:
+        return max(RATE_PREFLIGHT_COST, self.avg_cost)
+
+    def _projected(self) -> Optional[float]:
+        """Quota left once the requests in flight and the next one are charged, None until Canvas reports it."""
+        if self.remaining is None: return None
+        refilled = (time.monotonic() - self.seen_at) * RATE_REFILL_PER_SEC
+        return self.remaining + refilled - (self.in_flight + 1) * self._reserve()
+
+    def _delay(self) -> float:
+        """Seconds to hold the next request back, 0 when the bucket has room. Caller holds lock."""
+        proj = self._projected()
+        if proj is None:
+            return 0.0 if self.in_flight < max(1, RATE_UNKNOWN_CONCURRENCY) else RATE_RELEASE_POLL
+        if proj >= RATE_LOW_WATER: return 0.0
+        if self.in_flight and proj + self.in_flight * self._reserve() >= RATE_LOW_WATER:
+            return RATE_RELEASE_POLL  # room comes back as soon as a request in flight settles
+        return min(5.0, (RATE_LOW_WATER - proj) / RATE_REFILL_PER_SEC)
+
+    def _admit(self, start: float) -> None:
+        waited = time.monotonic() - start
+        if waited > 0.001:
+            self.throttled += 1; self.throttle_seconds += waited
+            metrics.inc("throttle_sleeps"); metrics.inc("throttle_seconds", waited)
+        self.in_flight += 1; self.requests += 1
+
+    async def acquire_async(self) -> None:
+        """Wait, sleeping on the event loop, until the bucket has room for one more request."""
+        start = time.monotonic()
+        while True:
+            with self.lock:
+                d = self._delay()
+                if d <= 0:
+                    self._admit(start); return
+            await asyncio.sleep(d)
+
+    def release(self, r: Optional[Any]) -> None:
+        """r is the httpx response (or None when the call failed)."""
+        with self.lock:
+            self.in_flight -= 1
+            if r is not None:
+                try: cost = float(r.headers.get("X-Request-Cost", ""))
+                except ValueError: cost = None
+                if cost is not None: self.avg_cost = 0.8 * self.avg_cost + 0.2 * cost
+                try:
+                    self.remaining = float(r.headers.get("X-Rate-Limit-Remaining", ""))
+                    self.seen_at = time.monotonic()
+                except ValueError: pass
+
+    def penalize(self) -> None:
+        """Canvas answered 403 Rate Limit Exceeded: treat the bucket as empty."""
+        with self.lock:
+            self.rate_limited += 1
+            self.remaining = min(self.remaining or 0.0, 0.0); self.seen_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"requests": self.requests, "in_flight": self.in_flight, "remaining": self.remaining,
+                    "avg_cost": round(self.avg_cost, 3), "throttled": self.throttled,
+                    "throttle_seconds": round(self.throttle_seconds, 3), "rate_limited": self.rate_limited}
+
+_governors: Dict[str, RateGovernor] = {}
+_governors_lock = threading.Lock()
+
+def _governor_key(url: str, headers: Dict[str, str]) -> str:
+    auth = (headers or {}).get("Authorization", "")
+    return urlsplit(url).netloc + ":" + hashlib.sha256(auth.encode()).hexdigest()[:12]
+
+def governor_for(url: str, headers: Dict[str, str]) -> RateGovernor:
+    key = _governor_key(url, headers)
+    with _governors_lock:
+        g = _governors.get(key)
+        if g is None: g = _governors[key] = RateGovernor()
+        return g
+
+def rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    with _governors_lock:
+        items = list(_governors.items())
+    return {k: g.stats() for k, g in items}
+
 # ---------------- HTTP helpers & pagination ----------------
-def _next_link(headers: Dict[str, str]) -> Optional[str]:
+PAGE_WORKERS = int(os.getenv("PAGE_WORKERS", "4"))  # pages of one collection fetched at once
+
+def _links(headers: Dict[str, str]) -> Dict[str, str]:
+    """Parse a Link header into {rel: url}."""
     link = headers.get("Link") or headers.get("link")
-    if not link: return None
+    out: Dict[str, str] = {}
+    if not link: return out
     for part in link.split(","):
         segs = [s.strip() for s in part.split(";")]
         if len(segs) < 2: continue
-        if any('rel="next"' in s for s in segs[1:]):
-            return segs[0].strip()[1:-1]
-    return None
-
-
-
-def _get(url: str, headers: Dict[str, str], params: Dict[str, Any] | None = None) -> requests.Response:
-    tries = 0
-    while True:
-        r = requests.get(url, headers=headers, params=params, timeout=60)
-        if r.status_code == 403 and "Rate Limit" in (r.text or "") and tries < 4:
-            tries += 1
-            time.sleep(min(30, 2 ** tries))
-            continue
-        try:
-            r.raise_for_status()
-            return r
-        except requests.HTTPError:
-            print(f"[Canvas ERROR] {r.status_code} GET {url} -> {r.text[:500]}")
-            raise
-
-
-def fetch_all(url: str, headers: Dict[str, str], params: Dict[str, Any] | None = None) -> List[Dict[str, Any]]:
-    out, first = [], True
-    while url:
-        r = _get(url, headers, params if first else None)
-        first = False
-        data = r.json()
-        out.extend(data if isinstance(data, list) else [data])
-        url = _next_link(r.headers)
+        for s in segs[1:]:
+            m = re.match(r'rel="?([^"]+)"?', s)
+            if m: out.setdefault(m.group(1), segs[0].strip()[1:-1])
     return out
 
-# ---------------- Canvas endpoints ----------------
-def get_courses(api_base: str, token: str, include_concluded=False) -> List[Dict[str, Any]]:
-    h = {"Authorization": f"Bearer {token}"}
-    p = {"per_page": 100}
-    if not include_concluded: p["enrollment_state"] = "active"
-    return fetch_all(f"{api_base}/users/self/courses", h, p)
-
-def get_course_detail(api_base: str, token: str, cid: int) -> Dict[str, Any]:
-    h = {"Authorization": f"Bearer {token}"}
-    return _get(f"{api_base}/courses/{cid}", h).json()
+def _next_link(headers: Dict[str, str]) -> Optional[str]:
+    return _links(headers).get("next")
 
-def get_assignments(api_base: str, token: str, cid: int) -> List[Dict[str, Any]]:
-    h = {"Authorization": f"Bearer {token}"}
-    return fetch_all(f"{api_base}/courses/{cid}/assignments", h, {"per_page": 100})
+def _page_number(url: str) -> Optional[int]:
+    """Numeric page= of a Link url, or None for bookmark cursors (page=bookmark:...)."""
+    vals = parse_qs(urlsplit(url).query).get("page")
+    if not vals or not vals[0].isdigit(): return None
+    return int(vals[0])
 
-def get_pages(api_base: str, token: str, cid: int) -> List[Dict[str, Any]]:
-    h = {"Authorization": f"Bearer {token}"}
-    return fetch_all(f"{api_base}/courses/{cid}/pages", h, {"per_page": 100, "include[]": "body"})
+def _with_page(url: str, page: int) -> str:
+    parts = urlsplit(url)
+    q = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != "page"] + [("page", str(page))]
+    return urlunsplit(parts._replace(query=urlencode(q)))
 
-def get_page_by_url(api_base: str, token: str, cid: int, page_url: str) -> Dict[str, Any]:
-    h = {"Authorization": f"Bearer {token}"}
-    return _get(f"{api_base}/courses/{cid}/pages/{page_url}", h).json()
 
-def get_modules(api_base: str, token: str, cid: int) -> List[Dict[str, Any]]:
-    h = {"Authorization": f"Bearer {token}"}
-    return fetch_all(f"{api_base}/courses/{cid}/modules", h, {"per_page": 100})
 
-def get_module_items(api_base: str, token: str, cid: int, mid: int) -> List[Dict[str, Any]]:
-    h = {"Authorization": f"Bearer {token}"}
-    return fetch_all(f"{api_base}/courses/{cid}/modules/{mid}/items", h, {"per_page": 100, "include[]": "content_details"})
+# ---------------- Response cache ----------------
+response_cache = make_response_cache()
 
-def get_files(api_base: str, token: str, cid: int) -> List[Dict[str, Any]]:
-    h = {"Authorization": f"Bearer {token}"}
-    return fetch_all(f"{api_base}/courses/{cid}/files", h, {"per_page": 100})
+def _cache_lookup(url: str, headers: Dict[str, str], params: Dict[str, Any] | None):
+    return response_cache.lookup((headers or {}).get("Authorization", ""), url, urlsplit(url).path, params)
 
-def get_file_by_id(api_base: str, token: str, file_id: int) -> Dict[str, Any]:
-    h = {"Authorization": f"Bearer {token}"}
-    return _get(f"{api_base}/files/{file_id}", h).json()
+async def _acache(fn: Callable[..., Any], *args: Any) -> Any:
+    """Call a response_cache method, in a worker thread when the backend does disk I/O."""
+    if response_cache.blocking: return await asyncio.to_thread(fn, *args)
+    return fn(*args)
 
-def get_discussions(api_base: str, token: str, cid: int) -> List[Dict[str, Any]]:
-    h = {"Authorization": f"Bearer {token}"}
-    return fetch_all(f"{api_base}/courses/{cid}/discussion_topics", h, {"per_page": 100})
+def _conditional(headers: Dict[str, str], cached: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """headers plus If-None-Match when a stale cached copy can be revalidated."""
+    return {**headers, "If-None-Match": cached["etag"]} if cached and cached.get("etag") else headers
 
-def get_discussion(api_base: str, token: str, cid: int, tid: int) -> Dict[str, Any]:
-    h = {"Authorization": f"Bearer {token}"}
-    return _get(f"{api_base}/courses/{cid}/discussion_topics/{tid}", h).json()
+def _as_list(data: Any) -> List[Any]:
+    return data if isinstance(data, list) else [data]
 
-def get_quizzes(api_base: str, token: str, cid: int) -> List[Dict[str, Any]]:
-    h = {"Authorization": f"Bearer {token}"}
-    return fetch_all(f"{api_base}/courses/{cid}/quizzes", h, {"per_page": 100})
+def _remaining_pages(links: Dict[str, str], limit: Optional[int], have: int, page_size: int) -> Optional[List[str]]:
+    """URLs of the pages still to fetch when Canvas numbers its pages and names the last one, else None."""
+    url = links.get("next")
+    if not url or "last" not in links: return None
+    nxt, last = _page_number(url), _page_number(links["last"])
+    if nxt is None or last is None or last < nxt: return None
+    if limit is not None and page_size:
+        last = min(last, nxt - 1 - (-(limit - have) // page_size))
+    return [_with_page(url, p) for p in range(nxt, last + 1)]
 
-def get_quiz(api_base: str, token: str, cid: int, qid: int) -> Dict[str, Any]:
-    h = {"Authorization": f"Bearer {token}"}
-    return _get(f"{api_base}/courses/{cid}/quizzes/{qid}", h).json()
+def _list_params(limit: Optional[int], **extra: Any) -> Dict[str, Any]:
+    return {"per_page": min(100, limit) if limit else 100, **extra}
 
+# ---------------- Canvas endpoints ----------------
 # ---------------- Page-linked file extraction ----------------
 class _FileLinkHTMLParser(HTMLParser):
     def __init__(self) -> None:
@@ -181,174 +285,707 @@ def extract_file_refs_from_html(html: str) -> List[Tuple[int, str]]:
             seen.add(fid); out.append((fid, href))
     return out
 
-def download_file_to(path: str, url: str, headers: Dict[str, str]) -> None:
-    with requests.get(url, stream=True, timeout=60) as r:
-        if r.status_code in (401, 403):
-            r.close()
-            with requests.get(url, headers=headers, stream=True, timeout=60) as rr:
-                rr.raise_for_status(); _stream_save(rr, path)
-        else:
-            r.raise_for_status(); _stream_save(r, path)
-
-def _stream_save(resp: requests.Response, path: str) -> None:
+blob_cache = BlobCache()
+
+async def adownload_file_to(path: str, url: str, headers: Dict[str, str]) -> None:
+    """Stream url to path through path.part. A .part left by an earlier failed attempt is resumed with a Range request;
+    if the server answers with a different range, the .part is dropped and the file downloaded from the start."""
+    client = async_http_client()
+    have = os.path.getsize(path + ".part") if os.path.exists(path + ".part") else 0
+    if not await _afetch_to(client, path, url, headers, have):
+        os.remove(path + ".part")
+        await _afetch_to(client, path, url, headers, 0)
+
+async def _afetch_to(client: httpx.AsyncClient, path: str, url: str, headers: Dict[str, str], have: int) -> bool:
+    extra = {"Accept-Encoding": "identity"}
+    if have: extra["Range"] = f"bytes={have}-"
+    async with client.stream("GET", url, headers=extra) as r:
+        if r.status_code not in (401, 403):
+            return await _asave_response(r, path, have)
+    async with client.stream("GET", url, headers={**headers, **extra}) as r:
+        return await _asave_response(r, path, have)
+
+def _range_start(resp: httpx.Response) -> Optional[int]:
+    """First byte of a 206 body, from "Content-Range: bytes <start>-<end>/<size>"."""
+    m = re.match(r"\s*bytes\s+(\d+)-", resp.headers.get("Content-Range", ""))
+    return int(m.group(1)) if m else None
+
+async def _asave_response(resp: httpx.Response, path: str, have: int) -> bool:
+    """Write the body to path (appending a 206 to the .part); False, with nothing written, when a 206
+    does not continue the .part at byte `have`."""
+    if resp.status_code == 416 and have:
+        os.remove(path + ".part")
+    resp.raise_for_status()
+    resumed = have > 0 and resp.status_code == 206
+    if resumed and _range_start(resp) != have:
+        return False
     tmp = path + ".part"
-    with open(tmp, "wb") as f:
-        for chunk in resp.iter_content(262144):
-            if chunk: f.write(chunk)
+    with open(tmp, "ab" if resumed else "wb") as f:
+        async for chunk in resp.aiter_bytes(262144):
+            f.write(chunk)
     os.replace(tmp, path)
+    return True
+
+async def adownload_file_cached(path: str, url: str, headers: Dict[str, str], api_base: str, meta: Dict[str, Any]) -> None:
+    """adownload_file_to, served from / recorded in the shared blob cache when meta carries a version.
+    Cache lookups and hashing run off the event loop."""
+    key = BlobCache.key_for(urlsplit(api_base).netloc, meta)
+    if await asyncio.to_thread(blob_cache.materialize, key, path):
+        metrics.inc("blob_cache_hits"); return
+    await adownload_file_to(path, url, headers)
+    await asyncio.to_thread(blob_cache.adopt, key, path)
 
 # ---------------- Enrichment ----------------
-def enrich_module_items(api_base, token, cid, items, pages_index, assignments_index, files_index, discussions_index, quizzes_index):
-    for it in items:
-        t = it.get("type")
-        if t == "Page":
-            page_url = it.get("page_url") or (it.get("content_details") or {}).get("page_url") or (it.get("url") or "").rsplit("/", 1)[-1]
-            if page_url:
-                page = pages_index.get(page_url) or get_page_by_url(api_base, token, cid, page_url)
-                it["page"] = page
-        elif t == "Assignment":
-            aid = it.get("content_id"); 
-            if isinstance(aid, int) and aid in assignments_index: it["assignment"] = assignments_index[aid]
-        elif t == "File":
-            fid = it.get("content_id")
-            if isinstance(fid, int):
-                meta = files_index.get(fid) or get_file_by_id(api_base, token, fid)
-                files_index[fid] = meta; it["file"] = meta
-        elif t == "Discussion":
-            tid = it.get("content_id")
-            if isinstance(tid, int):
-                topic = discussions_index.get(tid) or get_discussion(api_base, token, cid, tid)
-                discussions_index[tid] = topic; it["discussion"] = topic
-        elif t == "Quiz":
-            qid = it.get("content_id")
-            if isinstance(qid, int):
-                quiz = quizzes_index.get(qid) or get_quiz(api_base, token, cid, qid)
-                quizzes_index[qid] = quiz; it["quiz"] = quiz
+_ITEM_FIELD = {"pages": "page", "assignments": "assignment", "files": "file", "discussions": "discussion", "quizzes": "quiz"}
+_ITEM_INDEX = {"Assignment": "assignments", "File": "files", "Discussion": "discussions", "Quiz": "quizzes"}
+
+def _module_item_ref(it: Dict[str, Any]) -> Optional[Tuple[str, Any]]:
+    """(index name, key) of the object a module item points at, or None."""
+    t = it.get("type")
+    if t == "Page":
+        page_url = it.get("page_url") or (it.get("content_details") or {}).get("page_url") or (it.get("url") or "").rsplit("/", 1)[-1]
+        return ("pages", page_url) if page_url else None
+    content_id = it.get("content_id")
+    return (_ITEM_INDEX[t], content_id) if t in _ITEM_INDEX and isinstance(content_id, int) else None
+
+async def aenrich_module_items(api_base, token, cid, items, pages_index, assignments_index, files_index, discussions_index, quizzes_index, workers: Optional[int] = None):
+    """Attach the object behind each item. Objects missing from the indexes are fetched once each,
+    in one concurrent batch, and added to the indexes (assignments are only ever taken from the index)."""
+    indexes = {"pages": pages_index, "assignments": assignments_index, "files": files_index,
+               "discussions": discussions_index, "quizzes": quizzes_index}
+    fetchers = {
+        "pages": lambda url: aget_page_by_url(api_base, token, cid, url),
+        "files": lambda fid: aget_file_by_id(api_base, token, fid),
+        "discussions": lambda tid: aget_discussion(api_base, token, cid, tid),
+        "quizzes": lambda qid: aget_quiz(api_base, token, cid, qid),
+    }
+    refs, missing = _missing_refs(items, indexes, fetchers)
+    async for (kind, key), obj, err in arun_ordered(lambda r: fetchers[r[0]](r[1]), missing, _workers(workers, SECTION_WORKERS)):
+        if err is not None: raise err
+        indexes[kind][key] = obj
+    _attach_items(items, refs, indexes)
+
+def _missing_refs(items: List[Dict[str, Any]], indexes: Dict[str, Dict[Any, Any]], fetchable: Iterable[str]):
+    """Each item's ref, and the distinct fetchable refs the indexes cannot answer."""
+    refs = [_module_item_ref(it) for it in items]
+    return refs, list(dict.fromkeys(r for r in refs if r and r[0] in fetchable and not indexes[r[0]].get(r[1])))
+
+def _attach_items(items: List[Dict[str, Any]], refs: List[Optional[Tuple[str, Any]]], indexes: Dict[str, Dict[Any, Any]]) -> None:
+    for it, ref in zip(items, refs):
+        if ref is None: continue
+        kind, key = ref
+        if key in indexes[kind]: it[_ITEM_FIELD[kind]] = indexes[kind][key]
+
+# ---------------- Concurrency ----------------
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "4"))    # courses collected at once per request
+SECTION_WORKERS = int(os.getenv("SECTION_WORKERS", "6"))  # section fetches at once per course
+MAX_WORKERS = 32
+
+def _workers(value: Any, default: int) -> int:
+    try: n = int(value if value is not None else default)
+    except (TypeError, ValueError): n = default
+    return max(1, min(n, MAX_WORKERS))
+
+async def arun_ordered(fn: Callable[[Any], Awaitable[Any]], items: Iterable[Any], workers: int) -> AsyncIterator[Tuple[Any, Any, Optional[Exception]]]:
+    """Yield (item, result, error) in input order, running at most `workers` calls of fn at once.
+    Only ~2x workers results are held ahead of the consumer, so memory stays bounded."""
+    items = list(items)
+    sem = asyncio.Semaphore(max(1, workers))
+    async def call(it):
+        async with sem: return await fn(it)
+    window = max(1, workers) * 2
+    tasks = [asyncio.ensure_future(call(it)) for it in items[:window]]
+    try:
+        for i, it in enumerate(items):
+            if i + window < len(items):
+                tasks.append(asyncio.ensure_future(call(items[i + window])))
+            try: res, err = await tasks[i], None
+            except Exception as e: res, err = None, e
+            tasks[i] = None
+            yield it, res, err
+    finally:
+        for t in tasks:
+            if t is not None: t.cancel()
+
+async def arun_as_completed(fn: Callable[[Any], Awaitable[Any]], items: Iterable[Any], workers: int) -> AsyncIterator[Tuple[Any, Any, Optional[Exception]]]:
+    """Like arun_ordered, but yields each (item, result, error) as soon as it finishes."""
+    pending_items = list(items)[::-1]
+    running: Dict["asyncio.Future[Any]", Any] = {}
+    try:
+        while pending_items or running:
+            while pending_items and len(running) < max(1, workers):
+                it = pending_items.pop(); running[asyncio.ensure_future(fn(it))] = it
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for f in done:
+                it = running.pop(f)
+                try: res, err = f.result(), None
+                except Exception as e: res, err = None, e
+                yield it, res, err
+    finally:
+        for f in running: f.cancel()
+
+# ---------------- Canvas client ----------------
+# Everything runs on httpx, so the routes can be `async def` and a slow export holds no worker thread.
+# Export jobs run the same pipeline on an event loop of their own (see run_export_job).
+_aclients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+def async_http_client() -> httpx.AsyncClient:
+    """Pooled client for the running event loop (an AsyncClient cannot be shared between loops)."""
+    loop = asyncio.get_running_loop()
+    c = _aclients.get(loop)
+    if c is None:
+        c = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=http_pool_size() * HTTP_POOL_HOSTS, max_keepalive_connections=http_pool_size()),
+            headers={"Accept-Encoding": "gzip, deflate"}, timeout=60, follow_redirects=True)
+        c.cookies.jar.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        _aclients[loop] = c
+    return c
+
+async def aclose_http_client() -> None:
+    """Close the running loop's pooled client, for loops that end (an export job's)."""
+    c = _aclients.pop(asyncio.get_running_loop(), None)
+    if c is not None: await c.aclose()
+
+def _areplay(cached: Dict[str, Any]) -> httpx.Response:
+    return httpx.Response(200, headers=cached["headers"], content=cached["body"], request=httpx.Request("GET", cached["url"]))
+
+async def _aget(url: str, headers: Dict[str, str], params: Dict[str, Any] | None = None) -> httpx.Response:
+    key, cached, fresh = await _acache(_cache_lookup, url, headers, params)
+    if fresh:
+        metrics.inc("response_cache_hits", how="fresh")
+        return _areplay(cached)
+    send = _conditional(headers, cached)
+    gov = governor_for(url, headers)
+    tries = 0
+    while True:
+        await gov.acquire_async(); r = None
+        try:
+            r = await async_http_client().get(url, headers=send, params=params)
+        finally:
+            gov.release(r)
+        metrics.inc("api_calls", status=r.status_code)
+        if r.status_code == 304 and cached is not None:
+            metrics.inc("response_cache_hits", how="revalidated")
+            await _acache(response_cache.refresh, key)
+            return _areplay(cached)
+        if r.status_code == 403 and "Rate Limit" in (r.text or "") and tries < RATE_LIMIT_RETRIES:
+            tries += 1
+            metrics.inc("api_retries")
+            gov.penalize()
+            continue
+        try:
+            r.raise_for_status()
+            await _acache(response_cache.store, key, str(r.url), r.headers, r.content)
+            return r
+        except httpx.HTTPStatusError:
+            print(f"[Canvas ERROR] {r.status_code} GET {url} -> {r.text[:500]}")
+            raise
+
+async def _aget_json(url: str, headers: Dict[str, str], params: Dict[str, Any] | None = None) -> Any:
+    return (await _aget(url, headers, params)).json()
+
+async def afetch_all(url: str, headers: Dict[str, str], params: Dict[str, Any] | None = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """All items of a paginated collection, or just the first `limit` (no further pages are requested)."""
+    out, first = [], True
+    while url:
+        r = await _aget(url, headers, params if first else None)
+        first = False
+        data = _as_list(r.json())
+        out.extend(data)
+        if limit is not None and len(out) >= limit: return out[:limit]
+        links = _links(r.headers)
+        rest = _remaining_pages(links, limit, len(out), len(data))
+        if rest is not None:
+            async for _, page, err in arun_ordered(lambda u: _aget_json(u, headers), rest, _workers(PAGE_WORKERS, PAGE_WORKERS)):
+                if err is not None: raise err
+                out.extend(_as_list(page))
+            return out if limit is None else out[:limit]
+        url = links.get("next")
+    return out
+
+async def aget_courses(api_base: str, token: str, include_concluded=False) -> List[Dict[str, Any]]:
+    p = {"per_page": 100}
+    if not include_concluded: p["enrollment_state"] = "active"
+    return await afetch_all(f"{api_base}/users/self/courses", auth_headers(token), p)
+
+async def aget_course_detail(api_base: str, token: str, cid: int) -> Dict[str, Any]:
+    return await _aget_json(f"{api_base}/courses/{cid}", auth_headers(token))
+
+async def aget_assignments(api_base: str, token: str, cid: int, limit: Optional[int] = None, lean: bool = False) -> List[Dict[str, Any]]:
+    p = _list_params(limit)
+    if lean: p["exclude_response_fields[]"] = ["description", "rubric"]
+    return await afetch_all(f"{api_base}/courses/{cid}/assignments", auth_headers(token), p, limit)
+
+async def aget_pages(api_base: str, token: str, cid: int, include_body: bool = True, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    p = _list_params(limit)
+    if include_body: p["include[]"] = "body"
+    return await afetch_all(f"{api_base}/courses/{cid}/pages", auth_headers(token), p, limit)
+
+async def aget_page_by_url(api_base: str, token: str, cid: int, page_url: str) -> Dict[str, Any]:
+    return await _aget_json(f"{api_base}/courses/{cid}/pages/{page_url}", auth_headers(token))
+
+async def aget_modules(api_base: str, token: str, cid: int, include_items: bool = True) -> List[Dict[str, Any]]:
+    p: Dict[str, Any] = {"per_page": 100}
+    if include_items: p["include[]"] = ["items", "content_details"]
+    return await afetch_all(f"{api_base}/courses/{cid}/modules", auth_headers(token), p)
+
+async def aget_module_items(api_base: str, token: str, cid: int, mid: int) -> List[Dict[str, Any]]:
+    return await afetch_all(f"{api_base}/courses/{cid}/modules/{mid}/items", auth_headers(token), {"per_page": 100, "include[]": "content_details"})
+
+async def aget_files(api_base: str, token: str, cid: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    return await afetch_all(f"{api_base}/courses/{cid}/files", auth_headers(token), _list_params(limit), limit)
+
+async def aget_file_by_id(api_base: str, token: str, file_id: int) -> Dict[str, Any]:
+    return await _aget_json(f"{api_base}/files/{file_id}", auth_headers(token))
+
+async def aget_discussions(api_base: str, token: str, cid: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    return await afetch_all(f"{api_base}/courses/{cid}/discussion_topics", auth_headers(token), _list_params(limit), limit)
+
+async def aget_discussion(api_base: str, token: str, cid: int, tid: int) -> Dict[str, Any]:
+    return await _aget_json(f"{api_base}/courses/{cid}/discussion_topics/{tid}", auth_headers(token))
+
+async def aget_quizzes(api_base: str, token: str, cid: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    return await afetch_all(f"{api_base}/courses/{cid}/quizzes", auth_headers(token), _list_params(limit), limit)
+
+async def aget_quiz(api_base: str, token: str, cid: int, qid: int) -> Dict[str, Any]:
+    return await _aget_json(f"{api_base}/courses/{cid}/quizzes/{qid}", auth_headers(token))
 
 # ---------------- Course aggregation ----------------
-def collect_course(api_base: str, token: str, c: Dict[str, Any]) -> Dict[str, Any]:
+# (output key, fetcher, index key) in the order the sections appear in the course JSON
+COURSE_SECTIONS = [
+    ("assignments", aget_assignments, "id"),
+    ("pages", aget_pages, "url"),
+    ("files", aget_files, "id"),
+    ("discussions", aget_discussions, "id"),
+    ("quizzes", aget_quizzes, "id"),
+]
+SECTION_NAMES = {name for name, _, _ in COURSE_SECTIONS}
+
+def _course_plan(snapshot: Optional[Dict[str, Any]], sections: Optional[Iterable[str]], limit: Optional[int],
+                 lean: bool) -> Tuple[Set[str], bool, List[Tuple[str, Callable[..., Awaitable[Any]], Dict[str, Any]]]]:
+    """(sections fetched, reuse snapshot page bodies?, [(result name, fetcher, kwargs)]) for one course."""
+    wanted = set(sections) if sections is not None else SECTION_NAMES | {"modules"}
+    # module items are enriched from the section indexes, so modules pull in every section
+    fetched = wanted | SECTION_NAMES if "modules" in wanted else wanted
+    if "modules" in fetched: limit = None  # a truncated index would turn into per-item lookups
+    reuse_pages = not lean and bool(snapshot and snapshot.get("pages"))  # first export: one listing with bodies is cheaper
+    kwargs: Dict[str, Dict[str, Any]] = {name: {"limit": limit} for name in SECTION_NAMES}
+    kwargs["pages"]["include_body"] = not (lean or reuse_pages)
+    kwargs["assignments"]["lean"] = lean
+
+    # detail, the requested sections and the module list are independent: fetch them together
+    fetches = [] if lean else [("detail", aget_course_detail, {})]
+    fetches += [(name, fn, kwargs[name]) for name, fn, _ in COURSE_SECTIONS if name in fetched]
+    if "modules" in fetched: fetches.append(("modules", aget_modules, {}))
+    return fetched, reuse_pages, fetches
+
+def _assemble_course(out: Dict[str, Any], results: Dict[str, Tuple[Any, Optional[Exception]]], fetched: Set[str],
+                     lean: bool) -> Tuple[Dict[str, Dict[Any, Any]], Optional[List[Dict[str, Any]]]]:
+    """Copy fetched sections (or their errors) into out. Returns the section indexes and the modules
+    still to be enriched (None when modules were not fetched or failed)."""
+    if not lean:
+        detail, err = results["detail"]
+        if err is None: out["detail"] = detail
+        else: out["detail_error"] = str(err)
+
+    indexes: Dict[str, Dict[Any, Any]] = {}
+    for name, _, key in COURSE_SECTIONS:
+        xs, err = results.get(name, ([], None))
+        if err is None: out[name] = xs
+        else: xs = []; out[name] = []; out[f"{name}_error"] = str(err)
+        indexes[name] = {x.get(key): x for x in xs if x.get(key) not in (None, "")}
+
+    modules, err = results.get("modules", ([], None))
+    if err is not None or "modules" not in fetched:
+        out["modules"] = []
+        if err is not None: out["modules_error"] = str(err)
+        return indexes, None
+    return indexes, modules
+
+async def acollect_course(api_base: str, token: str, c: Dict[str, Any], workers: int = SECTION_WORKERS,
+                          snapshot: Optional[Dict[str, Any]] = None, sections: Optional[Iterable[str]] = None,
+                          limit: Optional[int] = None, lean: bool = False) -> Dict[str, Any]:
+    """With a snapshot (incremental mode) page bodies are only fetched for pages whose updated_at
+    moved, and a per-section change summary is added under "changes".
+    sections restricts what is fetched (others come back as []); limit stops each listing after that
+    many items; lean skips the course detail, page bodies and assignment descriptions."""
     cid = int(c["id"])
     out: Dict[str, Any] = {"id": cid, "name": c.get("name"), "course_code": c.get("course_code")}
-    try: out["detail"] = get_course_detail(api_base, token, cid)
-    except Exception as e: out["detail_error"] = str(e)
-
-    assignments = []
-    try: assignments = get_assignments(api_base, token, cid); out["assignments"] = assignments
-    except Exception as e: out["assignments"] = []; out["assignments_error"] = str(e)
-    assignments_index = {a.get("id"): a for a in assignments if a.get("id") is not None}
-
-    pages = []
-    try: pages = get_pages(api_base, token, cid); out["pages"] = pages
-    except Exception as e: out["pages"] = []; out["pages_error"] = str(e)
-    pages_index = {p.get("url", ""): p for p in pages if p.get("url")}
-
-    files_list = []
-    try: files_list = get_files(api_base, token, cid); out["files"] = files_list
-    except Exception as e: out["files"] = []; out["files_error"] = str(e)
-    files_index = {f.get("id"): f for f in files_list if f.get("id") is not None}
-
-    discussions = []
-    try: discussions = get_discussions(api_base, token, cid); out["discussions"] = discussions
-    except Exception as e: out["discussions"] = []; out["discussions_error"] = str(e)
-    discussions_index = {d.get("id"): d for d in discussions if d.get("id") is not None}
-
-    quizzes = []
-    try: quizzes = get_quizzes(api_base, token, cid); out["quizzes"] = quizzes
-    except Exception as e: out["quizzes"] = []; out["quizzes_error"] = str(e)
-    quizzes_index = {q.get("id"): q for q in quizzes if q.get("id") is not None}
+    workers = _workers(workers, SECTION_WORKERS)
 
-    try:
-        modules = get_modules(api_base, token, cid)
-        for m in modules:
-            mid = m.get("id")
+    fetched, reuse_pages, fetches = _course_plan(snapshot, sections, limit, lean)
+
+    async def fetch(f: Tuple[str, Callable[..., Awaitable[Any]], Dict[str, Any]]) -> Any:
+        with metrics.span("fetch_" + f[0]):
+            return await f[1](api_base, token, cid, **f[2])
+
+    with metrics.span("collect_course"):
+        results = {name: (res, err) async for (name, _, _), res, err in arun_ordered(fetch, fetches, workers)}
+        if reuse_pages and "pages" in results and results["pages"][1] is None:
+            with metrics.span("page_bodies"):
+                results["pages"] = (await _afill_page_bodies(api_base, token, cid, results["pages"][0], snapshot.get("pages") or {}, workers), None)
+
+        indexes, modules = _assemble_course(out, results, fetched, lean)
+        if modules is not None:
             try:
-                items = get_module_items(api_base, token, cid, int(mid))
+                with metrics.span("enrich"):
+                    need_items = [m for m in modules if "items" not in m]
+                    async for m, items, e in arun_ordered(lambda m: aget_module_items(api_base, token, cid, int(m.get("id"))), need_items, workers):
+                        if e is None: m["items"] = items
+                        else: m["items"] = []; m["_items_error"] = str(e)
+                    all_items = [it for m in modules for it in m.get("items") or []]
+                    await aenrich_module_items(api_base, token, cid, all_items, indexes["pages"], indexes["assignments"], indexes["files"], indexes["discussions"], indexes["quizzes"], workers)
+                out["modules"] = modules
             except Exception as e:
-                m["items"] = []; m["_items_error"] = str(e); continue
-            enrich_module_items(api_base, token, cid, items, pages_index, assignments_index, files_index, discussions_index, quizzes_index)
-            m["items"] = items
-        out["modules"] = modules
-    except Exception as e:
-        out["modules"] = []; out["modules_error"] = str(e)
+                out["modules"] = []; out["modules_error"] = str(e)
 
+    if snapshot is not None: out["changes"] = course_changes(snapshot, out, fetched)
     return out
 
-def write_course_json(folder: str, course_obj: Dict[str, Any]) -> str:
-    os.makedirs(folder, exist_ok=True)
+# ---------------- Incremental snapshots ----------------
+snapshots = SnapshotStore()
+
+async def _afill_page_bodies(api_base: str, token: str, cid: int, pages: List[Dict[str, Any]],
+                             prev_pages: Dict[str, Dict[str, Any]], workers: int) -> List[Dict[str, Any]]:
+    """Reuse the snapshot copy of each unchanged page; fetch the body only for new or edited pages."""
+    async def fill(p: Dict[str, Any]) -> Dict[str, Any]:
+        prev = _unchanged_page(prev_pages, p)
+        return prev if prev is not None else await aget_page_by_url(api_base, token, cid, p["url"])
+    return [res if err is None else p async for p, res, err in arun_ordered(fill, pages, workers)]
+
+def _unchanged_page(prev_pages: Dict[str, Dict[str, Any]], p: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    prev = prev_pages.get(p.get("url") or "")
+    if prev is not None and "body" in prev and stamp(prev) is not None and stamp(prev) == stamp(p):
+        return prev
+    return None
+
+def _section_stamps(course_obj: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    return {name: {str(x.get(key)): stamp(x) for x in course_obj.get(name) or [] if x.get(key) not in (None, "")}
+            for name, _, key in COURSE_SECTIONS}
+
+def course_changes(snapshot: Dict[str, Any], course_obj: Dict[str, Any], fetched: Iterable[str] = SECTION_NAMES) -> Dict[str, Any]:
+    prev = snapshot.get("stamps") or {}
+    summary: Dict[str, Any] = {"first_export": not prev}
+    for name, stamps in _section_stamps(course_obj).items():
+        if name in fetched and f"{name}_error" not in course_obj:
+            summary[name] = diff_stamps(prev.get(name) or {}, stamps)
+    return summary
+
+def course_snapshot(course_obj: Dict[str, Any], prev: Dict[str, Any], downloaded: Dict[str, Any],
+                    fetched: Iterable[str] = SECTION_NAMES) -> Dict[str, Any]:
+    stamps = _section_stamps(course_obj)
+    for name in stamps:
+        # a failed or skipped fetch this run says nothing about what exists: keep the old view
+        if name not in fetched or f"{name}_error" in course_obj: stamps[name] = (prev.get("stamps") or {}).get(name) or {}
+    pages = ((prev.get("pages") or {}) if "pages" not in fetched or "pages_error" in course_obj
+             else {p["url"]: p for p in course_obj.get("pages") or [] if p.get("url") and "body" in p})
+    return {"saved_at": time.time(), "stamps": stamps, "pages": pages,
+            "downloaded": {**(prev.get("downloaded") or {}), **downloaded}}
+
+async def asnapshot_user_id(api_base: str, token: str) -> Any:
+    return (await _aget_json(f"{api_base}/users/self", auth_headers(token))).get("id")
+
+def course_json_name(course_obj: Dict[str, Any]) -> str:
     cid = course_obj.get("id")
     cname = re.sub(r'[<>:"/\\|?*\x00-\x1F]', "_", (course_obj.get("name") or f"course_{cid}"))
     cname = re.sub(r"\s+", "_", cname)[:120]
-    path = os.path.join(folder, f"{cid}_{cname}.json")
+    return f"{cid}_{cname}.json"
+
+def write_course_json(folder: str, course_obj: Dict[str, Any]) -> str:
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, course_json_name(course_obj))
     with open(path, "w", encoding="utf-8") as f:
         json.dump(course_obj, f, indent=2, ensure_ascii=False)
     return path
 
-def download_page_linked_files_for_course(api_base, token, course_obj, download_dir) -> Tuple[int, List[str]]:
-    headers = {"Authorization": f"Bearer {token}"}
-    pages = course_obj.get("pages") or []
-    if not pages: return 0, []
+def course_files_dirname(course_obj: Dict[str, Any]) -> str:
+    cid = course_obj.get("id"); cname = course_obj.get("name") or f"course_{cid}"
+    safe_cname = re.sub(r'[<>:"/\\|?*\x00-\x1F]', "_", cname)
+    return f"{cid}_{safe_cname}_files"
+
+# ---------------- Download scheduler ----------------
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "4"))  # files of one course downloaded at once
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "3"))
+
+def new_download_report() -> Dict[str, Any]:
+    return {"downloaded": 0, "bytes": 0, "seconds": 0.0, "bytes_per_sec": 0, "failed": []}
+
+def _file_url(meta: Dict[str, Any]) -> Optional[str]:
+    return meta.get("url") or meta.get("download_url") or meta.get("public_url")
+
+def _file_out_path(download_dir: str, meta: Dict[str, Any], fid: Any) -> str:
+    name = meta.get("display_name") or meta.get("filename") or f"file_{fid}"
+    return os.path.join(download_dir, re.sub(r'[<>:"/\\|?*\x00-\x1F]', "_", name))
+
+def _retryable(e: Exception) -> bool:
+    resp = getattr(e, "response", None)
+    return resp is None or resp.status_code >= 500 or resp.status_code in (408, 416, 429)
+
+async def arun_downloads(api_base: str, headers: Dict[str, str], tasks: List[Tuple[str, str, Dict[str, Any]]],
+                         on_file: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                         report: Optional[Dict[str, Any]] = None, workers: int = DOWNLOAD_WORKERS) -> List[str]:
+    """Download (out_path, url, meta) tasks on a bounded pool, smallest first so they stream out early.
+    Each file is retried with backoff, resuming its .part; failures are listed in report instead of raised."""
+    report = report if report is not None else new_download_report()
+    tasks = _smallest_first(tasks)
+
+    async def one(task: Tuple[str, str, Dict[str, Any]]) -> str:
+        path, url, meta = task
+        for attempt in range(DOWNLOAD_RETRIES + 1):
+            try:
+                await adownload_file_cached(path, url, headers, api_base, meta)
+                break
+            except Exception as e:
+                if attempt == DOWNLOAD_RETRIES or not _retryable(e): raise
+                metrics.inc("download_retries")
+                await asyncio.sleep(min(30, 2 ** attempt))
+        if on_file: on_file(path, meta)
+        return path
+
+    start = time.monotonic()
+    downloaded: List[str] = []
+    async for (path, _, meta), _, err in arun_ordered(one, tasks, _workers(workers, DOWNLOAD_WORKERS)):
+        _record_download(report, downloaded, path, meta, err)
+    _finish_report(report, start)
+    return downloaded
+
+def _smallest_first(tasks: List[Tuple[str, str, Dict[str, Any]]]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    return sorted(tasks, key=lambda t: (t[2].get("size") is None, t[2].get("size") or 0))
+
+def _record_download(report: Dict[str, Any], downloaded: List[str], path: str, meta: Dict[str, Any], err: Optional[Exception]) -> None:
+    if err is None:
+        size = os.path.getsize(path)
+        downloaded.append(path)
+        report["downloaded"] += 1; report["bytes"] += size
+        metrics.inc("downloads"); metrics.inc("download_bytes", size)
+    else:
+        metrics.inc("download_failures")
+        report["failed"].append({"id": meta.get("id"), "name": os.path.basename(path), "error": str(err)})
+
+def _finish_report(report: Dict[str, Any], start: float) -> None:
+    report["seconds"] = round(report["seconds"] + time.monotonic() - start, 3)
+    report["bytes_per_sec"] = int(report["bytes"] / report["seconds"]) if report["seconds"] else 0
+
+async def adownload_page_linked_files_for_course(api_base, token, course_obj, download_dir, on_file: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                                                 skip: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                                                 report: Optional[Dict[str, Any]] = None) -> Tuple[int, List[str]]:
+    headers = auth_headers(token)
+    report = report if report is not None else new_download_report()
+    refs, known = _page_file_refs(course_obj)
+    if not refs: return 0, []
+    os.makedirs(download_dir, exist_ok=True)
+
+    async def meta_for(ref: Tuple[int, str]) -> Dict[str, Any]:
+        return known.get(ref[0]) or await aget_file_by_id(api_base, token, ref[0])
+
+    tasks, paths = [], set()
+    async for (fid, _), meta, err in arun_ordered(meta_for, refs, DOWNLOAD_WORKERS):
+        task = _linked_file_task(download_dir, fid, meta, err, skip, paths, report)
+        if task: tasks.append(task)
+    downloaded = await arun_downloads(api_base, headers, tasks, on_file, report)
+    return len(downloaded), downloaded
+
+def _page_file_refs(course_obj: Dict[str, Any]) -> Tuple[List[Tuple[int, str]], Dict[Any, Dict[str, Any]]]:
+    """Distinct file refs linked from the course pages, and the file metadata the course already holds."""
     refs = []
-    for p in pages:
+    for p in course_obj.get("pages") or []:
         refs.extend(extract_file_refs_from_html(p.get("body") or ""))
     # dedupe
     seen, refs_dedup = set(), []
     for fid, href in refs:
         if fid not in seen:
             seen.add(fid); refs_dedup.append((fid, href))
-    if not refs_dedup: return 0, []
-    os.makedirs(download_dir, exist_ok=True)
-    downloaded = []
-    for fid, _ in refs_dedup:
-        try:
-            meta = get_file_by_id(api_base, token, fid)
-            url = meta.get("url") or meta.get("download_url") or meta.get("public_url")
-            if not url: continue
-            name = meta.get("display_name") or meta.get("filename") or f"file_{fid}"
-            out_path = os.path.join(download_dir, re.sub(r'[<>:"/\\|?*\x00-\x1F]', "_", name))
-            if os.path.exists(out_path): continue
-            download_file_to(out_path, url, headers)
-            downloaded.append(out_path)
-        except Exception:
-            pass
-    return len(downloaded), downloaded
-
-def download_all_course_files(api_base, token, course_obj, download_dir) -> Tuple[int, List[str]]:
-    headers = {"Authorization": f"Bearer {token}"}
+    # metadata already fetched for this course (file list, module items) is not requested again
+    known = {f.get("id"): f for f in course_obj.get("files") or []}
+    for m in course_obj.get("modules") or []:
+        for it in m.get("items") or []:
+            if it.get("file"): known.setdefault(it["file"].get("id"), it["file"])
+    return refs_dedup, known
+
+def _linked_file_task(download_dir: str, fid: Any, meta: Optional[Dict[str, Any]], err: Optional[Exception],
+                      skip: Optional[Callable[[Dict[str, Any]], bool]], paths: Set[str],
+                      report: Dict[str, Any]) -> Optional[Tuple[str, str, Dict[str, Any]]]:
+    if err is not None:
+        report["failed"].append({"id": fid, "name": None, "error": str(err)}); return None
+    url = _file_url(meta)
+    if not url: return None
+    if skip and skip(meta): return None
+    out_path = _file_out_path(download_dir, meta, fid)
+    if out_path in paths or os.path.exists(out_path): return None
+    paths.add(out_path)
+    return out_path, url, meta
+
+async def adownload_all_course_files(api_base, token, course_obj, download_dir, on_file: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                                     skip: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                                     report: Optional[Dict[str, Any]] = None) -> Tuple[int, List[str]]:
+    headers = auth_headers(token)
+    report = report if report is not None else new_download_report()
     files = course_obj.get("files") or []
     if not files: return 0, []
     os.makedirs(download_dir, exist_ok=True)
-    downloaded = []
+    tasks, paths = [], set()
     for meta in files:
-        try:
-            fid = meta.get("id")
-            name = meta.get("display_name") or meta.get("filename") or f"file_{fid}"
-            out_path = os.path.join(download_dir, re.sub(r'[<>:"/\\|?*\x00-\x1F]', "_", name))
-            if os.path.exists(out_path): continue
-            url = meta.get("url") or meta.get("download_url") or meta.get("public_url")
-            if not url:
-                meta = get_file_by_id(api_base, token, int(fid))
-                url = meta.get("url") or meta.get("download_url") or meta.get("public_url")
-                if not url: continue
-            download_file_to(out_path, url, headers)
-            downloaded.append(out_path)
-        except Exception:
-            pass
+        fid = meta.get("id")
+        if skip and skip(meta): continue
+        out_path = _file_out_path(download_dir, meta, fid)
+        if out_path in paths or os.path.exists(out_path): continue
+        url = _file_url(meta)
+        if not url:
+            try: meta = await aget_file_by_id(api_base, token, int(fid))
+            except Exception as e:
+                report["failed"].append({"id": fid, "name": os.path.basename(out_path), "error": str(e)}); continue
+            url = _file_url(meta)
+            if not url: continue
+        paths.add(out_path); tasks.append((out_path, url, meta))
+    downloaded = await arun_downloads(api_base, headers, tasks, on_file, report)
     return len(downloaded), downloaded
 
-def make_zip_bytes(root_dir: str) -> bytes:
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
-        for folder, _, files in os.walk(root_dir):
-            for f in files:
-                full = os.path.join(folder, f)
-                rel = os.path.relpath(full, root_dir)
-                z.write(full, rel)
-    buf.seek(0)
-    return buf.read()
+# ---------------- Streaming ZIP ----------------
+# already-compressed formats are stored as-is; deflating them only burns CPU
+ZIP_STORED_EXTS = set(os.getenv(
+    "ZIP_STORED_EXTS",
+    "pdf,pptx,docx,xlsx,zip,gz,7z,rar,jpg,jpeg,png,gif,webp,mp3,m4a,mp4,mov,m4v,webm,avi,mkv",
+).lower().split(","))
+ZIP_CHUNK = 262144
+
+class _ZipSink(io.RawIOBase):
+    """Unseekable sink for zipfile: writes accumulate here until the response generator drains them."""
+    def __init__(self) -> None:
+        super().__init__()
+        self.buf = bytearray(); self.pos = 0
+    def writable(self): return True
+    def write(self, b):
+        self.buf += b; self.pos += len(b)
+        return len(b)
+    def tell(self): return self.pos
+    def drain(self) -> bytes:
+        out = bytes(self.buf); self.buf.clear()
+        return out
+
+def zip_compression_for(name: str, stored_exts: Set[str] = ZIP_STORED_EXTS) -> int:
+    ext = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+    return zipfile.ZIP_STORED if ext in stored_exts else zipfile.ZIP_DEFLATED
+
+async def astream_zip(entries: AsyncIterator[Tuple[str, Any]], stored_exts: Set[str] = ZIP_STORED_EXTS) -> AsyncIterator[bytes]:
+    """Yield a ZIP archive chunk by chunk. Each entry is (arcname, bytes) or (arcname, path on disk);
+    at most one ZIP_CHUNK of input is buffered at a time. Reading and compressing run in a worker
+    thread, one chunk per step, so the event loop keeps serving other requests meanwhile."""
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w") as z:
+        async for arcname, src in entries:
+            step = _zip_entry(z, sink, arcname, src, stored_exts)
+            while (chunk := await asyncio.to_thread(next, step, None)) is not None:
+                yield chunk
+    if sink.buf: yield sink.drain()
+
+def _zip_entry(z: zipfile.ZipFile, sink: _ZipSink, arcname: str, src: Any, stored_exts: Set[str]) -> Iterator[bytes]:
+    """Write one entry to z, yielding what reaches the sink as it goes."""
+    if isinstance(src, (bytes, bytearray)):
+        zi = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+        zi.file_size = len(src)
+    else:
+        zi = zipfile.ZipInfo.from_file(src, arcname)
+    zi.compress_type = zip_compression_for(arcname, stored_exts)
+    spent, t = 0.0, time.perf_counter()  # zip time excludes the time a yielded chunk spends with the consumer
+    with z.open(zi, "w") as w:
+        if isinstance(src, (bytes, bytearray)):
+            for i in range(0, len(src), ZIP_CHUNK):
+                w.write(src[i:i + ZIP_CHUNK])
+                if sink.buf:
+                    spent += time.perf_counter() - t; yield sink.drain(); t = time.perf_counter()
+        else:
+            with open(src, "rb") as f:
+                for chunk in iter(lambda: f.read(ZIP_CHUNK), b""):
+                    w.write(chunk)
+                    if sink.buf:
+                        spent += time.perf_counter() - t; yield sink.drain(); t = time.perf_counter()
+    metrics.observe("zip", spent + time.perf_counter() - t)
+    if sink.buf: yield sink.drain()
+
+async def aexport_entries(api_base: str, token: str, courses: List[Dict[str, Any]], tmp: str, workers: int,
+                          dl_page_links: bool, dl_all_files: bool, user_id: Any = None,
+                          pending: Optional[List[Tuple[Any, Dict[str, Any]]]] = None) -> AsyncIterator[Tuple[str, Any]]:
+    """Zip entries for /export, produced as each course JSON and downloaded file becomes ready.
+    Downloads go to a per-course folder under tmp that is removed once the course is zipped.
+    With user_id set the export is incremental: only files changed since the last snapshot are downloaded.
+    The new snapshot of each course is appended to pending as (course id, snapshot); the caller saves
+    them with save_snapshots() once the archive is complete, so files are only recorded as delivered
+    when the ZIP that holds them was written in full."""
+    incremental = user_id is not None
+    index: List[Dict[str, Any]] = []
+    prevs: Dict[int, Dict[str, Any]] = {}
+
+    async def collect(c: Dict[str, Any]) -> Dict[str, Any]:
+        if not incremental: return await acollect_course(api_base, token, c)
+        prev = prevs[id(c)] = await asyncio.to_thread(snapshots.load, api_base, user_id, c.get("id"))
+        return await acollect_course(api_base, token, c, snapshot=prev)
+
+    async for c, course_obj, err in arun_ordered(collect, courses, workers):
+        if err is not None: raise err
+        prev = prevs.pop(id(c), {})
+        entry = _index_entry(course_obj, incremental)
+        index.append(entry)
+        yield entry["file"], await asyncio.to_thread(_course_json, course_obj)
+
+        downloaded: Dict[str, Any] = {}
+        if dl_page_links or dl_all_files:
+            report = entry["downloads"] = new_download_report()
+            dirname = course_files_dirname(course_obj)
+            files_dir = os.path.join(tmp, dirname)
+            done: "asyncio.Queue[Optional[Tuple[str, Dict[str, Any]]]]" = asyncio.Queue()
+            skip = _already_downloaded(prev) if incremental else None
+
+            async def _download(course_obj=course_obj, files_dir=files_dir, done=done, skip=skip, report=report):
+                on_file = lambda path, meta: done.put_nowait((path, meta))
+                try:
+                    with metrics.span("downloads"):
+                        if dl_page_links:
+                            await adownload_page_linked_files_for_course(api_base, token, course_obj, files_dir, on_file=on_file, skip=skip, report=report)
+                        if dl_all_files:
+                            await adownload_all_course_files(api_base, token, course_obj, files_dir, on_file=on_file, skip=skip, report=report)
+                finally:
+                    done.put_nowait(None)
+
+            task = asyncio.ensure_future(_download())
+            try:
+                while (item := await done.get()) is not None:
+                    path, meta = item
+                    downloaded[str(meta.get("id"))] = stamp(meta)
+                    yield f"{dirname}/{os.path.basename(path)}", path
+                await task
+            finally:
+                task.cancel()
+            await asyncio.to_thread(shutil.rmtree, files_dir, True)
+
+        if incremental and pending is not None:
+            pending.append((course_obj.get("id"), course_snapshot(course_obj, prev, downloaded)))
+
+    yield "courses_index.json", json.dumps(index, indent=2, ensure_ascii=False).encode("utf-8")
+
+async def save_snapshots(api_base: str, user_id: Any, pending: List[Tuple[Any, Dict[str, Any]]]) -> None:
+    for cid, snap in pending:
+        await asyncio.to_thread(snapshots.save, api_base, user_id, cid, snap)
+
+def _course_json(course_obj: Dict[str, Any]) -> bytes:
+    return json.dumps(course_obj, indent=2, ensure_ascii=False).encode("utf-8")
+
+def _index_entry(course_obj: Dict[str, Any], incremental: bool) -> Dict[str, Any]:
+    entry = {
+        "id": course_obj.get("id"),
+        "name": course_obj.get("name"),
+        "file": course_json_name(course_obj),
+    }
+    if incremental: entry["changes"] = course_obj.get("changes")
+    return entry
+
+def _already_downloaded(prev: Dict[str, Any]) -> Callable[[Dict[str, Any]], bool]:
+    """skip() for incremental exports: files whose version was downloaded by an earlier run."""
+    seen = prev.get("downloaded") or {}
+    return lambda meta: stamp(meta) is not None and seen.get(str(meta.get("id"))) == stamp(meta)
 
 # ---------------- API route ----------------
 @app.post("/export")
-def export_canvas(payload: Dict[str, Any]):
+async def export_canvas(payload: Dict[str, Any]):
     """
     Body JSON:
     {
@@ -356,50 +993,135 @@ def export_canvas(payload: Dict[str, Any]):
       "token": "...",
       "include_concluded": false,
       "download_page_linked_files": true,
-      "download_all_files": false
+      "download_all_files": false,
+      "max_workers": 4,             # optional, courses collected concurrently
+      "zip_stored_extensions": ["pdf", "mp4"],  # optional, stored instead of deflated
+      "incremental": false,         # optional, reuse the last snapshot and only download changed files
+      "timings": false              # optional, add timings.json (per-phase seconds, API calls, ...) to the ZIP
     }
     """
+    opts = _export_options(payload)
+    api_base, token = opts["api_base"], opts["token"]
+    timings = Timings()
+
+    # listing courses up front keeps auth/listing failures as a proper HTTP error
+    with recording(timings), metrics.span("list_courses"):
+        courses = await aget_courses(api_base, token, include_concluded=opts["include_concluded"])
+        user_id = await asnapshot_user_id(api_base, token) if opts["incremental"] else None
+
+    pending: List[Tuple[Any, Dict[str, Any]]] = []
+
+    async def entries(tmp: str) -> AsyncIterator[Tuple[str, Any]]:
+        async for entry in aexport_entries(api_base, token, courses, tmp, opts["workers"],
+                                           opts["dl_page_links"], opts["dl_all_files"], user_id, pending):
+            yield entry
+        if opts["timings"]: yield "timings.json", json.dumps(timings.summary(), indent=2).encode("utf-8")
+
+    async def body() -> AsyncIterator[bytes]:
+        # temp workspace per request, only holds the course currently being downloaded
+        tmp = tempfile.mkdtemp(prefix="canvas_export_")
+        try:
+            with recording(timings):
+                async for chunk in astream_zip(entries(tmp), opts["stored_exts"]):
+                    yield chunk
+            # the last chunk was taken by the client: only now count the files as delivered
+            if user_id is not None: await save_snapshots(api_base, user_id, pending)
+        finally:
+            # wipe workspace
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    filename = "canvas_export.zip"
+    return StreamingResponse(body(), media_type="application/zip",
+                             headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+def _export_options(payload: Dict[str, Any]) -> Dict[str, Any]:
     api_base = payload.get("api_base")
     token = payload.get("token")
-    include_concluded = bool(payload.get("include_concluded", False))
-    dl_page_links = bool(payload.get("download_page_linked_files", False))
-    dl_all_files = bool(payload.get("download_all_files", False))
-
     if not api_base or not token:
         raise HTTPException(status_code=400, detail="api_base and token are required.")
+    stored = payload.get("zip_stored_extensions", ZIP_STORED_EXTS)
+    if not isinstance(stored, (list, set)) or not all(isinstance(e, str) for e in stored):
+        raise HTTPException(status_code=400, detail="zip_stored_extensions must be a list of strings.")
+    return {
+        "api_base": api_base,
+        "token": token,
+        "include_concluded": bool(payload.get("include_concluded", False)),
+        "dl_page_links": bool(payload.get("download_page_linked_files", False)),
+        "dl_all_files": bool(payload.get("download_all_files", False)),
+        "workers": _workers(payload.get("max_workers"), EXPORT_WORKERS),
+        "incremental": bool(payload.get("incremental", False)),
+        "timings": bool(payload.get("timings", False)),
+        "stored_exts": {e.lower().lstrip(".") for e in stored},
+    }
 
-    # temp workspace per request
+# ---------------- Background export jobs ----------------
+export_jobs = JobManager()
+
+async def _tracked(entries: AsyncIterator[Tuple[str, Any]], progress: Dict[str, Any]) -> AsyncIterator[Tuple[str, Any]]:
+    async for name, src in entries:
+        if isinstance(src, str):
+            progress["files_downloaded"] += 1
+            progress["bytes_downloaded"] += os.path.getsize(src)
+        elif name != "courses_index.json":
+            progress["courses_done"] += 1
+        yield name, src
+
+def run_export_job(job: ExportJob, opts: Dict[str, Any]) -> None:
+    """Runs on a job worker thread: the export goes through the same async pipeline as /export,
+    on an event loop of its own."""
+    timings = Timings()
+    with recording(timings):
+        asyncio.run(_run_export_job(job, opts, timings))
+    if opts["timings"]: job.timings = timings.summary()
+
+async def _run_export_job(job: ExportJob, opts: Dict[str, Any], timings: Timings) -> None:
+    api_base, token = opts["api_base"], opts["token"]
     tmp = tempfile.mkdtemp(prefix="canvas_export_")
     try:
-        courses = get_courses(api_base, token, include_concluded=include_concluded)
-        index: List[Dict[str, Any]] = []
-
-        for c in courses:
-            course_obj = collect_course(api_base, token, c)
-            course_json_path = write_course_json(tmp, course_obj)
-            index.append({
-                "id": course_obj.get("id"),
-                "name": course_obj.get("name"),
-                "file": os.path.basename(course_json_path),
-            })
-            cid = course_obj.get("id"); cname = course_obj.get("name") or f"course_{cid}"
-            files_dir = os.path.join(tmp, f"{cid}_{re.sub(r'[<>:\"/\\\\|?*\\x00-\\x1F]', '_', cname)}_files")
-
-            if dl_page_links:
-                download_page_linked_files_for_course(api_base, token, course_obj, files_dir)
-            if dl_all_files:
-                download_all_course_files(api_base, token, course_obj, files_dir)
-
-        with open(os.path.join(tmp, "courses_index.json"), "w", encoding="utf-8") as f:
-            json.dump(index, f, indent=2, ensure_ascii=False)
-
-        zip_bytes = make_zip_bytes(tmp)
-        filename = "canvas_export.zip"
-        return StreamingResponse(io.BytesIO(zip_bytes), media_type="application/zip",
-                                 headers={"Content-Disposition": f"attachment; filename={filename}"})
+        with metrics.span("list_courses"):
+            courses = await aget_courses(api_base, token, include_concluded=opts["include_concluded"])
+            user_id = await asnapshot_user_id(api_base, token) if opts["incremental"] else None
+        job.progress["courses_total"] = len(courses)
+        pending: List[Tuple[Any, Dict[str, Any]]] = []
+
+        async def entries() -> AsyncIterator[Tuple[str, Any]]:
+            async for entry in _tracked(aexport_entries(api_base, token, courses, tmp, opts["workers"],
+                                                        opts["dl_page_links"], opts["dl_all_files"], user_id, pending), job.progress):
+                yield entry
+            if opts["timings"]: yield "timings.json", json.dumps(timings.summary(), indent=2).encode("utf-8")
+        with open(job.path + ".part", "wb") as f:
+            async for chunk in astream_zip(entries(), opts["stored_exts"]):
+                f.write(chunk); job.progress["bytes_written"] += len(chunk)
+        os.replace(job.path + ".part", job.path)
+        if user_id is not None: await save_snapshots(api_base, user_id, pending)
     finally:
-        # wipe workspace
         shutil.rmtree(tmp, ignore_errors=True)
+        try: os.remove(job.path + ".part")
+        except OSError: pass
+        await aclose_http_client()
+
+@app.post("/export_jobs")
+def start_export_job(payload: Dict[str, Any]):
+    """Same body as /export. Returns immediately with a job_id to poll."""
+    opts = _export_options(payload)
+    job = export_jobs.submit(opts["token"], lambda job: run_export_job(job, opts))
+    return job.to_dict(export_jobs.ttl)
+
+@app.get("/export_jobs/{job_id}")
+def export_job_status(job_id: str):
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job.to_dict(export_jobs.ttl)
+
+@app.get("/export_jobs/{job_id}/download")
+def export_job_download(job_id: str):
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail={"message": "Export not finished", "status": job.status, "error": job.error})
+    return FileResponse(job.path, media_type="application/zip", filename="canvas_export.zip")
 
 # in app.py
 
@@ -447,40 +1169,44 @@ def safe_json(resp):
     except Exception:
         return resp.text
 
-def validate_token(api_base: str, token: str):
-    """Confirms the token by calling /users/self. Raises 401 on failure."""
-    import requests
-    h = {"Authorization": f"Bearer {token}"}
+async def avalidate_token(api_base: str, token: str):
+    """Confirms the token by calling /users/self. Raises 401 on failure.
+    Goes through the response cache, so repeated calls within its ttl cost no Canvas request."""
     url = f"{api_base}/users/self"
     try:
-        r = requests.get(url, headers=h, timeout=30)
-        if r.status_code != 200:
-            raise HTTPException(
-                status_code=401,
-                detail={
-                    "message": "Canvas token invalid or expired",
-                    "status": r.status_code,
-                    "api": url,
-                    "response": safe_json(r),
-                },
-            )
-        return r.json()
-    except requests.HTTPError as e:
-        resp = e.response
-        raise HTTPException(
-            status_code=resp.status_code if resp is not None else 500,
-            detail={"message": "Failed to validate token", "api": url, "response": safe_json(resp) if resp else None},
-        )
+        return (await _aget(url, auth_headers(token))).json()
+    except httpx.HTTPStatusError as e:
+        raise _invalid_token(url, e.response)
+
+def _invalid_token(url: str, r) -> HTTPException:
+    return HTTPException(
+        status_code=401,
+        detail={
+            "message": "Canvas token invalid or expired",
+            "status": r.status_code,
+            "api": url,
+            "response": safe_json(r),
+        },
+    )
 
 
 @app.post("/structured_export")
-def structured_export(payload: Dict[str, Any]):
+async def structured_export(payload: Dict[str, Any]):
     """
     Same input as /export, but returns JSON instead of a ZIP.
     Optional:
       - include: list[str] sections to include
       - compact: bool
       - limit_per_section: int
+      - max_workers: int  courses collected concurrently
+      - incremental: bool  reuse unchanged page bodies from the last snapshot, report "changes"
+                           (ignored with compact, which only sees a trimmed view of each course)
+      - stream: bool  respond with NDJSON, one line per course (or per-course error record)
+                      written as soon as that course finishes, in completion order
+      - timings: bool  add a "timings" summary (per-phase seconds, API calls, cache hits, ...);
+                       in stream mode it is the last line, {"timings": {...}}
+    Only the included sections are fetched. In compact mode each listing stops at
+    limit_per_section and page bodies / assignment descriptions are not requested.
     """
     api_base = payload.get("api_base")
     token = payload.get("token")
@@ -488,23 +1214,43 @@ def structured_export(payload: Dict[str, Any]):
     include = set(payload.get("include", ["assignments","pages","files","discussions","quizzes","modules"]))
     compact = bool(payload.get("compact", False))
     limit = int(payload.get("limit_per_section", 200))
+    workers = _workers(payload.get("max_workers"), EXPORT_WORKERS)
+    stream = bool(payload.get("stream", False))
+    incremental = bool(payload.get("incremental", False)) and not compact
+    want_timings = bool(payload.get("timings", False))
+    timings = Timings()
+    if compact:
+        # compact_course keeps only these sections, trimmed to limit: fetch nothing else
+        plan: Dict[str, Any] = {"sections": include & {"assignments", "pages", "files"}, "limit": limit, "lean": True}
+    else:
+        plan = {"sections": include}
 
     if not api_base or not token:
         raise HTTPException(status_code=400, detail="api_base and token are required.")
 
     print(f"[structured_export] api_base={api_base} token_prefix={token[:6]}***")
-    validate_token(api_base, token)
+    with recording(timings):
+        with metrics.span("validate_token"):
+            user = await avalidate_token(api_base, token)
 
-    try:
-        courses = get_courses(api_base, token, include_concluded=include_concluded)
-        print(f"[structured_export] fetched {len(courses)} courses")
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Failed to list courses: {e}")
+        try:
+            with metrics.span("list_courses"):
+                courses = await aget_courses(api_base, token, include_concluded=include_concluded)
+            print(f"[structured_export] fetched {len(courses)} courses")
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Failed to list courses: {e}")
 
-    all_data: List[Dict[str, Any]] = []
-    for c in courses:
+    async def collect(c: Dict[str, Any]) -> Dict[str, Any]:
+        if not incremental: return await acollect_course(api_base, token, c, **plan)
+        prev = await asyncio.to_thread(snapshots.load, api_base, user.get("id"), c.get("id"))
+        course_obj = await acollect_course(api_base, token, c, snapshot=prev, **plan)
+        fetched = include | SECTION_NAMES if "modules" in include else include
+        await asyncio.to_thread(snapshots.save, api_base, user.get("id"), course_obj.get("id"), course_snapshot(course_obj, prev, {}, fetched))
+        return course_obj
+
+    def finish(c: Dict[str, Any], course_obj: Optional[Dict[str, Any]], err: Optional[Exception]) -> Dict[str, Any]:
         try:
-            course_obj = collect_course(api_base, token, c)
+            if err is not None: raise err
 
             # Optionally drop sections not requested
             if "assignments" not in include: course_obj["assignments"] = []
@@ -517,44 +1263,79 @@ def structured_export(payload: Dict[str, Any]):
             if compact:
                 course_obj = compact_course(course_obj, limit)  # define helper if you use compacting
 
-            all_data.append(course_obj)
+            return course_obj
         except Exception as e:
-            all_data.append({
+            return {
                 "id": c.get("id"),
                 "name": c.get("name"),
                 "error": str(e)
-            })
+            }
+
+    if stream:
+        async def lines() -> AsyncIterator[bytes]:
+            with recording(timings):
+                async for c, course_obj, err in arun_as_completed(collect, courses, workers):
+                    yield (json.dumps(finish(c, course_obj, err), ensure_ascii=False) + "\n").encode("utf-8")
+            if want_timings: yield (json.dumps({"timings": timings.summary()}) + "\n").encode("utf-8")
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
 
-    return {"courses": all_data}
+    with recording(timings):
+        all_data = [finish(c, course_obj, err) async for c, course_obj, err in arun_ordered(collect, courses, workers)]
+    result: Dict[str, Any] = {"courses": all_data}
+    if want_timings: result["timings"] = timings.summary()
+    return result
 
 
 
 @app.middleware("http")
 async def log_requests(request, call_next):
     print(f">>> {request.method} {request.url.path}")
+    start = time.perf_counter()
     try:
         resp = await call_next(request)
         print(f"<<< {resp.status_code} {request.method} {request.url.path}")
+        metrics.observe_request(request.method, _route_label(request), resp.status_code, time.perf_counter() - start)
         return resp
     except Exception as e:
+        metrics.observe_request(request.method, _route_label(request), 500, time.perf_counter() - start)
         import traceback
         traceback.print_exc()
         raise
 
+def _route_label(request) -> str:
+    """Route template (/export_jobs/{job_id}) rather than the raw path, to keep label values few."""
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
 @app.post("/ping_canvas")
-def ping_canvas(payload: Dict[str, Any]):
+async def ping_canvas(payload: Dict[str, Any]):
     api_base = payload.get("api_base"); token = payload.get("token")
     if not api_base or not token:
         raise HTTPException(status_code=400, detail="api_base and token required")
-    user = validate_token(api_base, token)  # calls /users/self
+    user = await avalidate_token(api_base, token)  # calls /users/self
     return {"ok": True, "user_id": user.get("id"), "name": user.get("name")}
 
-
-
-
-
-
-
-
-
-
+@app.get("/rate_limits")
+def rate_limits():
+    """Per-token (hashed) Canvas quota state and time spent throttled."""
+    return {"governors": rate_limit_stats()}
+
+def _metric_samples():
+    for key, g in rate_limit_stats().items():
+        if g["remaining"] is not None:
+            yield "rate_limit_remaining", "gauge", "Last X-Rate-Limit-Remaining Canvas reported, per token (hashed)", {"governor": key}, g["remaining"]
+        yield "requests_in_flight", "gauge", "Canvas requests currently in flight, per token (hashed)", {"governor": key}, g["in_flight"]
+    for state, n in export_jobs.counts().items():
+        yield "export_jobs", "gauge", "Background export jobs by status", {"status": state}, n
+
+metrics.register(_metric_samples)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus text exposition of the counters, phase timings and gauges above."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache_stats")
+def cache_stats():
+    """Hit / revalidation / miss counts of the Canvas response cache and the file blob cache."""
+    return {"responses": response_cache.stats(), "blobs": blob_cache.stats()}
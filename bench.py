@@ -0,0 +1,147 @@
+"""End-to-end timings of app.py against mock_canvas.py.
+
+    python bench.py                                   # default sizes, saved under bench_results/
+    python bench.py --courses 8 --latency-ms 80 --repeat 3
+    python bench.py --compare bench_results/bench-20240101-120000.json
+
+Every run of a scenario happens in a fresh subprocess, so caches start cold and peak RSS is
+that run's own. API calls and bytes come from the mock server's counters."""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from mock_canvas import DEFAULTS, MockCanvas, add_size_args, start_background
+
+BENCH_TOKEN = "bench-token"
+RESULTS_DIR = "bench_results"
+
+# scenario -> (route, extra body) ; None = acollect_course called directly for every course
+SCENARIOS: Dict[str, Optional[Tuple[str, Dict[str, Any]]]] = {
+    "collect_course": None,
+    "structured_export": ("/structured_export", {}),
+    "structured_export_compact": ("/structured_export", {"compact": True, "limit_per_section": 20}),
+    "export": ("/export", {}),
+    "export_files": ("/export", {"download_page_linked_files": True, "download_all_files": True}),
+}
+
+# app settings worth recording next to the numbers
+ENV_KEYS = ("EXPORT_WORKERS", "SECTION_WORKERS", "PAGE_WORKERS", "DOWNLOAD_WORKERS", "HTTP_POOL_SIZE",
+            "RESPONSE_CACHE", "BLOB_CACHE_MAX_BYTES", "CANVAS_RATE_LOW_WATER", "CANVAS_RATE_PREFLIGHT",
+            "CANVAS_RATE_UNKNOWN_CONCURRENCY")
+
+
+def peak_rss_kb() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def run_child(scenario: str, api_base: str) -> Dict[str, Any]:
+    """One timed run inside this (fresh) process."""
+    import app
+    from fastapi.testclient import TestClient
+    body = {"api_base": api_base, "token": BENCH_TOKEN}
+    client = TestClient(app.app)
+    start = time.perf_counter()
+    if SCENARIOS[scenario] is None:
+        async def collect() -> List[Dict[str, Any]]:
+            courses = await app.aget_courses(api_base, BENCH_TOKEN)
+            return [await app.acollect_course(api_base, BENCH_TOKEN, c) for c in courses]
+        nbytes = len(json.dumps(asyncio.run(collect())).encode())
+    else:
+        route, extra = SCENARIOS[scenario]
+        with client.stream("POST", route, json={**body, **extra}) as r:
+            r.raise_for_status()
+            nbytes = sum(len(chunk) for chunk in r.iter_bytes())
+    return {"wall_seconds": round(time.perf_counter() - start, 4), "response_bytes": nbytes, "peak_rss_kb": peak_rss_kb()}
+
+
+def run_once(mock: MockCanvas, scenario: str, api_base: str) -> Dict[str, Any]:
+    mock.reset_stats()
+    with tempfile.TemporaryDirectory(prefix="canvas_bench_") as tmp:
+        env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+        for var in ("BLOB_CACHE_DIR", "SNAPSHOT_DIR", "RESPONSE_CACHE_DIR", "EXPORT_JOBS_DIR"):
+            env[var] = os.path.join(tmp, var.lower())
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", scenario, "--api-base", api_base],
+                              env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        raise RuntimeError(f"{scenario} failed:\n{proc.stderr[-2000:]}")
+    run = json.loads(proc.stdout.strip().splitlines()[-1])
+    stats = mock.snapshot_stats()
+    run.update({"api_calls": stats["calls"] - stats["downloads"], "downloads": stats["downloads"],
+                "bytes_transferred": stats["bytes_sent"], "rate_limited": stats["rate_limited"],
+                "not_modified": stats["not_modified"], "by_endpoint": stats["by_endpoint"]})
+    return run
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    med = lambda k: statistics.median(r[k] for r in runs) if all(r.get(k) is not None for r in runs) else None
+    keys = ("wall_seconds", "api_calls", "downloads", "bytes_transferred", "rate_limited", "response_bytes", "peak_rss_kb")
+    return {**{k: med(k) for k in keys}, "runs": runs}
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> str:
+    lines = [f"{'scenario':28} {'wall s (old -> new)':>26} {'api calls':>18} {'peak rss MB':>18}"]
+    for name, res in new["results"].items():
+        prev = old.get("results", {}).get(name)
+        if not prev: continue
+        def cell(key: str, scale: float = 1.0, fmt: str = "{:.2f}") -> str:
+            a, b = prev.get(key), res.get(key)
+            if a is None or b is None: return "n/a"
+            return f"{fmt.format(a / scale)} -> {fmt.format(b / scale)}" + (f" ({b / a:.2f}x)" if a else "")
+        lines.append(f"{name:28} {cell('wall_seconds'):>26} {cell('api_calls', fmt='{:.0f}'):>18} {cell('peak_rss_kb', 1024, '{:.0f}'):>18}")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Benchmark app.py against a local mock Canvas.")
+    p.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated, default all")
+    p.add_argument("--repeat", type=int, default=1)
+    p.add_argument("--out", help=f"result file, default {RESULTS_DIR}/bench-<time>.json")
+    p.add_argument("--compare", help="earlier result file to print a comparison against")
+    p.add_argument("--child", help=argparse.SUPPRESS)
+    p.add_argument("--api-base", help=argparse.SUPPRESS)
+    add_size_args(p)
+    args = p.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.api_base)))
+        return
+
+    mock = MockCanvas(**{k: getattr(args, k) for k in DEFAULTS})
+    server, api_base = start_background(mock)
+    results: Dict[str, Any] = {}
+    try:
+        for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+            if name not in SCENARIOS: sys.exit(f"unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+            results[name] = summarize([run_once(mock, name, api_base) for _ in range(max(1, args.repeat))])
+            r = results[name]
+            print(f"{name:28} {r['wall_seconds']:8.2f}s  {r['api_calls']:6} calls  {r['bytes_transferred'] / 1e6:8.2f} MB"
+                  f"  rss {(r['peak_rss_kb'] or 0) / 1024:6.0f} MB  403s {r['rate_limited']}")
+    finally:
+        server.should_exit = True
+
+    report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "mock": mock.cfg,
+              "env": {k: os.environ[k] for k in ENV_KEYS if k in os.environ}, "results": results}
+    out = args.out or os.path.join(RESULTS_DIR, time.strftime("bench-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"saved {out}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print(compare(json.load(f), report))
+
+
+if __name__ == "__main__":
+    main()
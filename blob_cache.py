@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+from storage import private_dir
+
+BLOB_CACHE_DIR = os.getenv("BLOB_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "canvas_blob_cache")
+BLOB_CACHE_MAX_BYTES = int(os.getenv("BLOB_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))  # 0 disables the cache
+BLOB_CACHE_SCAN_SECONDS = 60  # recount the blobs on disk (shared with other workers) at least this often
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1048576), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:  # other filesystem, or links not supported
+        shutil.copyfile(src, dst)
+
+
+class BlobCache:
+    """Downloaded Canvas files stored once per content hash.
+
+    Lookups go through a version key (host, file id, updated_at, size) so an edited file misses,
+    while the same bytes reached through several courses or file ids share one blob.
+    The directory is the index: keys/<hash of key> holds the blob's sha256 and a blob's mtime is its
+    last use, so every worker on the host sees the others' entries and adding a file writes one
+    small file. Blobs are evicted least-recently-used first once their total size passes max_bytes."""
+    def __init__(self, root: str = BLOB_CACHE_DIR, max_bytes: int = BLOB_CACHE_MAX_BYTES) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.scanning = threading.Lock()  # one recount/eviction pass at a time
+        self.total = 0    # bytes in blobs/ as of the last scan, plus what this process added since
+        self.count = 0
+        self.scanned = 0.0
+        self.hits = 0
+        self.misses = 0
+        if self.enabled:
+            private_dir(root)
+            for sub in ("blobs", "keys"):
+                os.makedirs(os.path.join(root, sub), exist_ok=True)
+            self._import_index()
+            self._scan()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key_for(host: str, meta: Dict[str, Any]) -> Optional[str]:
+        fid, size = meta.get("id"), meta.get("size")
+        version = meta.get("updated_at") or meta.get("modified_at")
+        if fid is None or size is None or not version: return None
+        return f"{host}:{fid}:{version}:{size}"
+
+    def _blob_path(self, sha: str) -> str:
+        return os.path.join(self.root, "blobs", sha[:2], sha)
+
+    def _key_path(self, key: str) -> str:
+        h = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.root, "keys", h[:2], h)
+
+    def _lookup(self, key: str) -> Optional[str]:
+        try:
+            with open(self._key_path(key), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _write_key(self, key: str, sha: str) -> None:
+        path = self._key_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(sha)
+        os.replace(tmp, path)
+
+    def materialize(self, key: Optional[str], dest: str) -> bool:
+        """Link (or copy) the cached blob for key to dest. False on a miss."""
+        if not self.enabled or key is None: return False
+        sha = self._lookup(key)
+        if sha is not None:
+            blob = self._blob_path(sha)
+            os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+            try:
+                _link_or_copy(blob, dest)
+                os.utime(blob)
+            except OSError:  # evicted, possibly by another worker, since the key was written
+                sha = None
+        with self.lock:
+            if sha is None: self.misses += 1
+            else: self.hits += 1
+        return sha is not None
+
+    def adopt(self, key: Optional[str], path: str) -> None:
+        """Record a freshly downloaded file under key; identical content is stored only once."""
+        if not self.enabled or key is None: return
+        sha = file_sha256(path)
+        blob = self._blob_path(sha)
+        added = 0
+        try:
+            os.utime(blob)
+        except OSError:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            tmp = f"{blob}.{os.getpid()}.{threading.get_ident()}.part"
+            _link_or_copy(path, tmp)
+            os.replace(tmp, blob)  # a worker storing the same bytes at once just replaces an identical file
+            added = os.path.getsize(blob)
+        self._write_key(key, sha)
+        with self.lock:
+            self.total += added; self.count += 1 if added else 0
+            due = self.total > self.max_bytes or time.time() - self.scanned > BLOB_CACHE_SCAN_SECONDS
+        if due: self._scan()
+
+    def _scan(self) -> None:
+        """Recount blobs/ (other workers add and evict too) and evict down to max_bytes."""
+        if not self.scanning.acquire(blocking=False): return
+        try:
+            found = []
+            for sub in os.scandir(os.path.join(self.root, "blobs")):
+                if not sub.is_dir(): continue
+                for e in os.scandir(sub.path):
+                    if e.name.endswith(".part"): continue
+                    try: st = e.stat()
+                    except OSError: continue
+                    found.append((st.st_mtime, st.st_size, e.path))
+            total, count = sum(size for _, size, _ in found), len(found)
+            if total > self.max_bytes:
+                for _, size, path in sorted(found):
+                    if total <= self.max_bytes: break
+                    try: os.remove(path)
+                    except OSError: pass
+                    total -= size; count -= 1
+                self._prune_keys()
+            with self.lock:
+                self.total, self.count, self.scanned = total, count, time.time()
+        finally:
+            self.scanning.release()
+
+    def _prune_keys(self) -> None:
+        """Remove keys whose blob has been evicted."""
+        for sub in os.scandir(os.path.join(self.root, "keys")):
+            if not sub.is_dir(): continue
+            for e in os.scandir(sub.path):
+                try:
+                    with open(e.path, "r", encoding="utf-8") as f:
+                        sha = f.read().strip()
+                    if not os.path.exists(self._blob_path(sha)): os.remove(e.path)
+                except OSError:
+                    pass
+
+    def _import_index(self) -> None:
+        """Carry over the keys of the single index.json that earlier versions kept."""
+        legacy = os.path.join(self.root, "index.json")
+        try:
+            with open(legacy, "r", encoding="utf-8") as f:
+                keys = json.load(f).get("keys", {})
+        except (OSError, ValueError):
+            return
+        for key, sha in keys.items():
+            if os.path.exists(self._blob_path(sha)): self._write_key(key, sha)
+        os.remove(legacy)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "blobs": self.count,
+                    "bytes": self.total, "max_bytes": self.max_bytes}
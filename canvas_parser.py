@@ -1,17 +1,30 @@
 import pdfplumber
 from pathlib import Path
+from extraction import extract_many
 
-def extract_text_from_pdf(file_path):
-    text = ""
+def iter_pdf_pages(file_path):
+    """Text of each page, one at a time, so a large PDF is never held as one growing string."""
     with pdfplumber.open(file_path) as pdf:
         for page in pdf.pages:
-            text += page.extract_text() or ""
-    return text.strip()
+            yield page.extract_text() or ""
+            page.close()  # drop the parsed layout of pages already done
 
-def load_all_texts_from_folder(folder="data"):
+def pdf_pages(file_path):
+    return [p.strip() for p in iter_pdf_pages(file_path)]
+
+def extract_text_from_pdf(file_path):
+    return "\n".join(p for p in pdf_pages(file_path) if p).strip()
+
+def load_pdfs(paths):
     chunks = []
-    for file in Path(folder).glob("*.pdf"):
-        content = extract_text_from_pdf(file)
+    for path, pages, err in extract_many("pdf", [str(p) for p in paths], pdf_pages):
+        if err is not None:
+            print(f"❌ Failed to parse {Path(path).name}: {err}")
+            continue
+        content = "\n".join(p for p in pages if p).strip()
         if content:
-            chunks.append({"filename": file.name, "content": content})
+            chunks.append({"filename": Path(path).name, "content": content, "pages": pages})
     return chunks
+
+def load_all_texts_from_folder(folder="data"):
+    return load_pdfs(sorted(Path(folder).glob("*.pdf")))
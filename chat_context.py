@@ -0,0 +1,131 @@
+import os
+import time
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from canvas_parser import load_pdfs
+from json_parser import load_json_files
+from ppt_parser import load_ppts
+from retrieval import Retriever, chunks_from_json, chunks_from_pdfs, chunks_from_ppts
+
+# kind -> (folder, pattern)
+CONTEXT_DIRS: Dict[str, Tuple[str, str]] = {
+    "pdf": (os.getenv("CHAT_PDF_DIR", "data"), "*.pdf"),
+    "json": (os.getenv("CHAT_JSON_DIR", "json"), "*.json"),
+    "ppt": (os.getenv("CHAT_PPT_DIR", "ppt"), "*.pptx"),
+}
+CONTEXT_WATCH_SECONDS = float(os.getenv("CONTEXT_WATCH_SECONDS", "30"))  # poll the folders this often, 0 = only POST /reload
+
+
+def _chunks_for(kind: str, paths: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """path -> chunks, parsing only the given documents."""
+    out: Dict[str, List[Dict[str, Any]]] = {p: [] for p in paths}
+    if kind == "pdf":
+        docs = {d["filename"]: d for d in load_pdfs(paths)}
+        for p in paths:
+            if Path(p).name in docs: out[p] = chunks_from_pdfs([docs[Path(p).name]])
+    elif kind == "ppt":
+        docs = {d["filename"]: d for d in load_ppts(paths)}
+        for p in paths:
+            if Path(p).name in docs: out[p] = chunks_from_ppts([docs[Path(p).name]])
+    else:
+        for p, blocks in zip(paths, load_json_files(paths)): out[p] = chunks_from_json(blocks)
+    return out
+
+
+class Snapshot(NamedTuple):
+    """One published state of the corpus: the index and the corpus version it was built from."""
+    retriever: Retriever
+    fingerprint: str  # hash of every document's (path, mtime, size); same corpus -> same value
+    version: int
+
+
+class ChatContext:
+    """The /chat corpus, loaded in the background and kept in step with the source folders.
+
+    reload() reparses only documents whose mtime or size changed (or that are new), rebuilds the
+    index from the per-document chunks and publishes it with its fingerprint as one Snapshot, in one
+    assignment. A request reads `current` once and uses that pair throughout, so an answer is never
+    computed with one index and cached under another's version."""
+    def __init__(self, dirs: Dict[str, Tuple[str, str]] = CONTEXT_DIRS,
+                 dense: Optional[Callable[[List[Dict[str, Any]]], Any]] = None) -> None:
+        self.dirs = dirs
+        self.dense = dense
+        self.current: Optional[Snapshot] = None
+        self.docs: Dict[str, Dict[str, Any]] = {}  # path -> {"kind", "stamp", "chunks"}
+        self.lock = threading.Lock()  # one reload at a time
+        self.loading = False
+        self.loaded_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.last_reload: Dict[str, Any] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.current is not None
+
+    @property
+    def version(self) -> int:
+        snap = self.current
+        return snap.version if snap else 0
+
+    def scan(self) -> Dict[str, Tuple[str, List[int]]]:
+        found: Dict[str, Tuple[str, List[int]]] = {}
+        for kind, (folder, pattern) in self.dirs.items():
+            for p in sorted(Path(folder).glob(pattern)):
+                try: st = p.stat()
+                except OSError: continue
+                found[str(p)] = (kind, [st.st_mtime_ns, st.st_size])
+        return found
+
+    def reload(self, force: bool = False) -> Dict[str, Any]:
+        """Bring the index up to date with the folders; returns what changed."""
+        with self.lock:
+            start = time.perf_counter()
+            current = self.scan()
+            changed = [p for p, (kind, stamp) in current.items() if force or self.docs.get(p, {}).get("stamp") != stamp]
+            removed = [p for p in self.docs if p not in current]
+            summary = {"changed": len(changed), "removed": len(removed), "version": self.version}
+            if not changed and not removed and self.current is not None: return summary
+
+            self.loading = True
+            try:
+                docs = {p: d for p, d in self.docs.items() if p in current}
+                for kind in self.dirs:
+                    paths = [p for p in changed if current[p][0] == kind]
+                    for p, chunks in _chunks_for(kind, paths).items():
+                        docs[p] = {"kind": kind, "stamp": current[p][1], "chunks": chunks}
+                chunks = [c for p in sorted(docs) for c in docs[p]["chunks"]]
+                retriever = Retriever(chunks, self.dense(chunks) if self.dense else None)
+                fingerprint = hashlib.sha256(repr(sorted((p, d["stamp"]) for p, d in docs.items())).encode()).hexdigest()[:16]
+                self.docs = docs
+                self.current = Snapshot(retriever, fingerprint, self.version + 1)  # the swap
+                self.loaded_at = time.time(); self.error = None
+            except Exception as e:
+                self.error = str(e)
+                raise
+            finally:
+                self.loading = False
+            summary.update({"version": self.version, "chunks": len(chunks), "seconds": round(time.perf_counter() - start, 3)})
+            self.last_reload = summary
+            return summary
+
+    def _run(self, interval: float) -> None:
+        while True:
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"❌ Reloading course material failed: {e}")
+            if interval <= 0: return
+            time.sleep(interval)
+
+    def start(self, interval: float = CONTEXT_WATCH_SECONDS) -> None:
+        """First load, then (interval > 0) a poll of the folders every interval seconds, in a daemon thread."""
+        threading.Thread(target=self._run, args=(interval,), daemon=True, name="chat-context").start()
+
+    def status(self) -> Dict[str, Any]:
+        snap = self.current
+        return {"ready": snap is not None, "loading": self.loading, "version": snap.version if snap else 0,
+                "fingerprint": snap.fingerprint if snap else "", "documents": len(self.docs), "loaded_at": self.loaded_at,
+                "error": self.error, "last_reload": self.last_reload, "index": snap.retriever.stats() if snap else None}
@@ -0,0 +1,171 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from retrieval import tokenize
+from storage import private_dir
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "off").lower()  # off | hash | openai
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "384"))  # hash backend only
+EMBEDDING_BATCH = int(os.getenv("EMBEDDING_BATCH", "64"))
+EMBEDDING_DIR = os.getenv("EMBEDDING_DIR") or os.path.join(tempfile.gettempdir(), "canvas_embeddings")
+
+
+# ---------------- Backends ----------------
+def _normalize(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    return (m / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+
+class HashEmbedder:
+    """Offline, deterministic embeddings: signed feature hashing of words and word pairs.
+    No model quality, but the same text always gets the same vector (tests, local runs)."""
+    def __init__(self, dim: int = EMBEDDING_DIM) -> None:
+        self.dim = dim
+        self.name = f"hash-{dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        m = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = tokenize(text)
+            for feat in words + [a + " " + b for a, b in zip(words, words[1:])]:
+                h = int.from_bytes(hashlib.blake2b(feat.encode(), digest_size=8).digest(), "little")
+                m[row, h % self.dim] += 1.0 if (h >> 63) else -1.0
+        return _normalize(m)
+
+
+class OpenAIEmbedder:
+    def __init__(self, model: str = EMBEDDING_MODEL) -> None:
+        self.model = model
+        self.name = model
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        from llm_engine import get_client
+        resp = get_client().embeddings.create(model=self.model, input=texts)
+        return _normalize(np.array([d.embedding for d in sorted(resp.data, key=lambda d: d.index)], dtype=np.float32))
+
+
+def make_embedder(kind: str = EMBEDDING_BACKEND) -> Optional[Any]:
+    if kind == "hash": return HashEmbedder()
+    if kind == "openai": return OpenAIEmbedder()
+    return None
+
+
+# ---------------- Store ----------------
+def chunk_key(chunk: Dict[str, Any]) -> str:
+    """Content address of a chunk: unchanged chunks of an edited (or renamed) file keep their vector."""
+    return hashlib.sha256((chunk["title"] + "\n" + chunk["text"]).encode("utf-8")).hexdigest()
+
+
+class DenseIndex:
+    """Cosine top-k over the store's memory-mapped matrix, restricted to the rows of one chunk list."""
+    def __init__(self, embedder: Any, vectors: np.ndarray, row_chunk: np.ndarray) -> None:
+        self.embedder = embedder
+        self.vectors = vectors      # (rows, dim) float32, unit length
+        self.row_chunk = row_chunk  # row -> chunk index, -1 for rows of chunks no longer in the corpus
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        return self.search_many([query], k)[0]
+
+    def search_many(self, queries: List[str], k: int) -> List[List[Tuple[int, float]]]:
+        """One matrix product for all queries."""
+        if not len(self.vectors) or not queries: return [[] for _ in queries]
+        scores = self.embedder.embed(queries) @ self.vectors.T  # (queries, rows)
+        scores[:, self.row_chunk < 0] = -np.inf
+        k = min(k, int((self.row_chunk >= 0).sum()))
+        if k <= 0: return [[] for _ in queries]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        out = []
+        for q, rows in enumerate(top):
+            rows = rows[np.argsort(-scores[q, rows], kind="stable")]
+            out.append([(int(self.row_chunk[r]), float(scores[q, r])) for r in rows])
+        return out
+
+
+class EmbeddingStore:
+    """Chunk embeddings on disk: vectors.f32 (float32 rows, memory-mapped) + meta.json (row -> chunk key).
+
+    sync(chunks) embeds only chunks whose key is not stored yet, so a restart re-embeds nothing and
+    a changed file costs only its changed chunks. Rows of chunks that left the corpus are dropped
+    once they outnumber the live rows."""
+    def __init__(self, embedder: Any, root: str = EMBEDDING_DIR, batch: int = EMBEDDING_BATCH) -> None:
+        self.embedder = embedder
+        self.batch = max(1, batch)
+        self.root = os.path.join(root, hashlib.sha256(embedder.name.encode()).hexdigest()[:16])
+        self.lock = threading.Lock()
+        self.embedded = 0  # chunks embedded by this process
+        private_dir(root)
+        os.makedirs(self.root, exist_ok=True)
+        self.keys: List[str] = []
+        self.dim: Optional[int] = None
+        try:
+            with open(self._path("meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("model") == embedder.name:
+                self.keys, self.dim = meta["keys"], meta["dim"]
+        except (OSError, ValueError, KeyError):
+            pass
+        vectors = self._path("vectors.f32")
+        if self.dim and (not os.path.exists(vectors) or os.path.getsize(vectors) < len(self.keys) * self.dim * 4):
+            self.keys, self.dim = [], None  # vectors file lost or cut short
+        self.rows = {k: i for i, k in enumerate(self.keys)}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _vectors(self) -> np.ndarray:
+        if not self.keys: return np.zeros((0, self.dim or 1), dtype=np.float32)
+        return np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r", shape=(len(self.keys), self.dim))
+
+    def _save_meta(self) -> None:
+        tmp = self._path("meta.json.part")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"model": self.embedder.name, "dim": self.dim, "keys": self.keys}, f)
+        os.replace(tmp, self._path("meta.json"))
+
+    def _append(self, keys: List[str], texts: List[str]) -> None:
+        mode = "ab" if self.keys else "wb"
+        with open(self._path("vectors.f32"), mode) as f:
+            if mode == "ab": f.truncate(len(self.keys) * (self.dim or 0) * 4)  # drop rows a crash left unlisted
+            for i in range(0, len(texts), self.batch):
+                m = self.embedder.embed(texts[i:i + self.batch])
+                self.dim = self.dim or m.shape[1]
+                f.write(np.ascontiguousarray(m, dtype=np.float32).tobytes())
+                for k in keys[i:i + self.batch]:
+                    self.rows[k] = len(self.keys); self.keys.append(k)
+                self.embedded += len(m)
+        self._save_meta()
+
+    def _compact(self, live: List[str]) -> None:
+        old = self._vectors()
+        keep = sorted({self.rows[k] for k in live})
+        m = np.array(old[keep]) if keep else np.zeros((0, self.dim or 1), dtype=np.float32)
+        del old
+        tmp = self._path("vectors.f32.part")
+        with open(tmp, "wb") as f: f.write(m.tobytes())
+        os.replace(tmp, self._path("vectors.f32"))
+        self.keys = [self.keys[r] for r in keep]
+        self.rows = {k: i for i, k in enumerate(self.keys)}
+        self._save_meta()
+
+    def sync(self, chunks: List[Dict[str, Any]]) -> DenseIndex:
+        """Embed what is missing and return an index over exactly these chunks (same order)."""
+        with self.lock:
+            keys = [chunk_key(c) for c in chunks]
+            missing: Dict[str, str] = {}
+            for k, c in zip(keys, chunks):
+                if k not in self.rows and k not in missing: missing[k] = c["title"] + "\n" + c["text"]
+            if missing: self._append(list(missing), list(missing.values()))
+            if len(self.keys) > 2 * len(set(keys)) + 1024: self._compact(keys)
+            row_chunk = np.full(len(self.keys), -1, dtype=np.int64)
+            for i, k in enumerate(keys): row_chunk[self.rows[k]] = i
+            return DenseIndex(self.embedder, self._vectors(), row_chunk)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"model": self.embedder.name, "dim": self.dim, "rows": len(self.keys), "embedded": self.embedded}
@@ -0,0 +1,144 @@
+import os
+import tempfile
+import threading
+import time
+import uuid
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from storage import private_dir
+
+JOB_WORKERS = int(os.getenv("EXPORT_JOB_WORKERS", "4"))         # exports running at once per process
+JOBS_PER_TOKEN = int(os.getenv("EXPORT_JOBS_PER_TOKEN", "2"))   # of those, at most this many per token
+JOB_TTL_SECONDS = int(os.getenv("EXPORT_JOB_TTL", "3600"))      # finished artifacts kept this long
+JOBS_DIR = os.getenv("EXPORT_JOBS_DIR") or os.path.join(tempfile.gettempdir(), "canvas_export_jobs")
+DISK_SWEEP_SECONDS = 300  # how often sweep() also looks for expired files of other processes
+
+
+class ExportJob:
+    def __init__(self, token_key: str, run: Callable[["ExportJob"], None], path: str) -> None:
+        self.id = uuid.uuid4().hex
+        self.token_key = token_key
+        self.run: Optional[Callable[["ExportJob"], None]] = run
+        self.path = path
+        self.status = "queued"  # queued -> running -> done | error
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.progress: Dict[str, Any] = {"courses_total": None, "courses_done": 0,
+                                         "files_downloaded": 0, "bytes_downloaded": 0, "bytes_written": 0}
+        self.timings: Optional[Dict[str, Any]] = None  # set when the export asked for a timing summary
+
+    def to_dict(self, ttl: int = JOB_TTL_SECONDS) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "expires": self.finished + ttl if self.finished else None,
+            "progress": dict(self.progress),
+            **({"timings": self.timings} if self.timings is not None else {}),
+        }
+
+
+class JobManager:
+    """Runs export jobs on a worker pool, at most `per_token` at a time for the same token,
+    and keeps finished artifacts on disk for `ttl` seconds so they can be downloaded again.
+    root is shared with earlier runs and other workers: any file in it older than ttl is deleted."""
+    def __init__(self, workers: int = JOB_WORKERS, per_token: int = JOBS_PER_TOKEN,
+                 ttl: int = JOB_TTL_SECONDS, root: str = JOBS_DIR) -> None:
+        self.workers = max(1, workers)
+        self.per_token = max(1, per_token)
+        self.ttl = ttl
+        self.root = root
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export-job")
+        self.lock = threading.Lock()
+        self.jobs: Dict[str, ExportJob] = {}
+        self.queued: List[ExportJob] = []
+        self.running: Dict[str, int] = {}  # token_key -> running jobs
+        private_dir(root)
+        self.disk_swept = 0.0
+        self._sweep_disk()
+
+    def submit(self, token: str, run: Callable[[ExportJob], None], suffix: str = ".zip") -> ExportJob:
+        """Queue run(job); run must write the finished artifact to job.path."""
+        self.sweep()
+        token_key = hashlib.sha256(token.encode()).hexdigest()
+        job = ExportJob(token_key, run, "")
+        job.path = os.path.join(self.root, job.id + suffix)
+        with self.lock:
+            self.jobs[job.id] = job
+            self.queued.append(job)
+        self._dispatch()
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        self.sweep()
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def counts(self) -> Dict[str, int]:
+        """Known jobs by status."""
+        with self.lock:
+            out = {s: 0 for s in ("queued", "running", "done", "error")}
+            for j in self.jobs.values(): out[j.status] = out.get(j.status, 0) + 1
+            return out
+
+    def _dispatch(self) -> None:
+        start: List[ExportJob] = []
+        with self.lock:
+            busy = sum(self.running.values())
+            for job in list(self.queued):
+                if busy >= self.workers: break
+                if self.running.get(job.token_key, 0) >= self.per_token: continue
+                self.queued.remove(job)
+                self.running[job.token_key] = self.running.get(job.token_key, 0) + 1
+                job.status = "running"; job.started = time.time()
+                busy += 1; start.append(job)
+        for job in start:
+            self.pool.submit(self._run, job)
+
+    def _run(self, job: ExportJob) -> None:
+        try:
+            job.run(job)
+            job.status = "done"
+        except Exception as e:
+            job.status = "error"; job.error = str(e)
+            try: os.remove(job.path)
+            except OSError: pass
+        finally:
+            job.finished = time.time()
+            job.run = None  # drop the closure (and the token it captured)
+            with self.lock:
+                self.running[job.token_key] -= 1
+                if not self.running[job.token_key]: del self.running[job.token_key]
+            self._dispatch()
+
+    def sweep(self) -> None:
+        """Forget jobs (and delete artifacts) that finished more than ttl seconds ago."""
+        now = time.time()
+        with self.lock:
+            expired = [j for j in self.jobs.values() if j.finished and now - j.finished > self.ttl]
+            for j in expired: del self.jobs[j.id]
+        for j in expired:
+            try: os.remove(j.path)
+            except OSError: pass
+        if now - self.disk_swept >= min(self.ttl, DISK_SWEEP_SECONDS): self._sweep_disk()
+
+    def _sweep_disk(self) -> None:
+        """Delete files in root last written more than ttl ago: artifacts and stray .part files left by
+        a process that has since exited, which no in-memory job list will ever expire."""
+        self.disk_swept = now = time.time()
+        try:
+            entries = list(os.scandir(self.root))
+        except OSError:
+            return
+        for e in entries:
+            try:
+                if e.is_file() and now - e.stat().st_mtime > self.ttl: os.remove(e.path)
+            except OSError:
+                pass
@@ -0,0 +1,101 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Optional, Tuple
+
+from storage import private_dir
+
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))  # processes parsing documents
+EXTRACT_CACHE_DIR = os.getenv("EXTRACT_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "canvas_extract_cache")
+EXTRACT_VERSION = 2  # bump when an extractor's output changes, so cached text is redone
+
+
+class TextCache:
+    """Extracted text per document, one JSON file per (kind, path). An entry is only used while the
+    file's mtime and size are unchanged; a changed file overwrites its own entry."""
+    def __init__(self, root: str = EXTRACT_CACHE_DIR) -> None:
+        self.root = root
+        private_dir(root)
+
+    def _entry(self, kind: str, path: str) -> Tuple[str, List[Any]]:
+        st = os.stat(path)
+        key = hashlib.sha256(f"{kind}|{os.path.abspath(path)}".encode()).hexdigest()
+        return os.path.join(self.root, key + ".json"), [EXTRACT_VERSION, st.st_mtime_ns, st.st_size]
+
+    def get(self, kind: str, path: str) -> Optional[List[str]]:
+        file, stamp = self._entry(kind, path)
+        try:
+            with open(file, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry["parts"] if entry.get("stamp") == stamp else None
+
+    def put(self, kind: str, path: str, parts: List[str]) -> None:
+        file, stamp = self._entry(kind, path)
+        tmp = f"{file}.{os.getpid()}.part"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"path": os.path.abspath(path), "stamp": stamp, "parts": parts}, f, ensure_ascii=False)
+        os.replace(tmp, file)
+
+
+text_cache = TextCache()
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _process_pool(workers: int) -> ProcessPoolExecutor:
+    """Parser processes shared by every reload, started on first use. Children come from a forkserver
+    (spawn where there is none): the server has threads (event loop, to_thread workers, the reload
+    thread), and a forked child can inherit a lock one of them held and deadlock on it."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def _drop_pool(pool: ProcessPoolExecutor) -> None:
+    """Forget a pool whose worker died, so the next call starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool: _pool = None
+    pool.shutdown(wait=False)
+
+
+def extract_many(kind: str, paths: List[str], extract: Callable[[str], List[str]],
+                 workers: int = EXTRACT_WORKERS, cache: Optional[TextCache] = text_cache) -> List[Tuple[str, Optional[List[str]], Optional[Exception]]]:
+    """(path, parts, error) for every path, in order. Cached documents are not reparsed; the rest are
+    parsed in a shared process pool (extract must be a module-level function so it can be pickled)."""
+    out: List[Tuple[str, Optional[List[str]], Optional[Exception]]] = []
+    misses: List[int] = []
+    for path in paths:
+        parts = cache.get(kind, path) if cache else None
+        out.append((path, parts, None))
+        if parts is None: misses.append(len(out) - 1)
+    if not misses: return out
+
+    def finish(i: int, parts: Optional[List[str]], err: Optional[Exception]) -> None:
+        out[i] = (out[i][0], parts, err)
+        if err is None and cache: cache.put(kind, out[i][0], parts)
+
+    if workers <= 1 or len(misses) == 1:
+        for i in misses:
+            try: finish(i, extract(out[i][0]), None)
+            except Exception as e: finish(i, None, e)
+        return out
+    ex = _process_pool(workers)
+    futs = [(i, ex.submit(extract, out[i][0])) for i in misses]
+    for i, fut in futs:
+        try: finish(i, fut.result(), None)
+        except BrokenProcessPool as e:
+            _drop_pool(ex); finish(i, None, e)
+        except Exception as e: finish(i, None, e)
+    return out
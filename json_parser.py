@@ -1,32 +1,261 @@
+import re
 import json
+from html import unescape
 from pathlib import Path
-import re
+from extraction import extract_many
+
+# ---------------- HTML to text ----------------
+_BLOCK_TAGS = {"p", "div", "br", "li", "ul", "ol", "tr", "table", "h1", "h2", "h3", "h4", "h5", "h6",
+               "blockquote", "pre", "hr", "section", "article", "header", "footer", "dt", "dd"}
+_SKIP_TAGS = {"script", "style"}
+
+def html_to_text(html):
+    """Visible text of an HTML fragment in one left-to-right pass: tags dropped, block tags become
+    line breaks, script/style content and comments skipped, entities decoded."""
+    if not html:
+        return ""
+    out = []
+    i, n, skip = 0, len(html), None
+    while i < n:
+        j = html.find("<", i)
+        if j < 0:
+            j = n
+        if skip is None and j > i:
+            out.append(html[i:j])
+        if j >= n:
+            break
+        if html.startswith("<!--", j):
+            end = html.find("-->", j + 4)
+            i = n if end < 0 else end + 3
+            continue
+        k = html.find(">", j + 1)
+        if k < 0:  # unterminated tag: the rest is text
+            if skip is None:
+                out.append(html[j:])
+            break
+        tag = html[j + 1:k]
+        closing = tag.startswith("/")
+        parts = tag.lstrip("/").split(None, 1)
+        name = parts[0].rstrip("/").lower() if parts else ""  # "<\n>", "</ >": no name, dropped like any tag
+        if skip is not None:
+            if closing and name == skip:
+                skip = None
+        elif name in _SKIP_TAGS and not closing:
+            skip = name
+        elif name in _BLOCK_TAGS:
+            out.append("\n")
+        i = k + 1
+    lines = (" ".join(line.split()) for line in unescape("".join(out)).split("\n"))
+    return "\n".join(line for line in lines if line)
 
 def strip_html(html):
-    # Basic HTML tag remover
-    return re.sub(r"<[^>]+>", "", html or "").replace("\n", " ").strip()
+    return html_to_text(html).replace("\n", " ").strip()
 
-def load_json_from_folder(folder="json"):
-    text_blocks = []
+# ---------------- Streaming JSON ----------------
+_WS = " \t\n\r"
+_SPECIAL = re.compile(r'["\[\]{}]')
+_STRING_END = re.compile(r'(?:[^"\\]|\\.)*"', re.S)
+_NUMBER_END = re.compile(r"[,\]}\s]")
+
+class JsonStream:
+    """Reads a JSON document from a text file a piece at a time. Containers are walked with
+    members()/items(); only the values asked for with value() are built, the rest are skip()ped
+    without materializing them."""
+
+    def __init__(self, f, size=1 << 16):
+        self.f = f
+        self.size = size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _more(self, size=None):
+        if self.eof:
+            return False
+        data = self.f.read(size or self.size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._more():
+                return ""
 
-    for path in Path(folder).glob("*.json"):
-        print(f"📂 Parsing: {path.name}")
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
+    def _take(self, ch):
+        if self.peek() != ch:
+            raise ValueError(f"expected {ch!r}, found {self.peek()!r}")
+        self.pos += 1
 
-            course_name = data.get("name", "Unknown Course")
-            text_blocks.append(f"📘 {course_name}")
+    def value(self):
+        """The next value, fully decoded (reads on until it is complete)."""
+        if self.peek() in "-0123456789":  # a number is only complete once something follows it
+            while not _NUMBER_END.search(self.buf, self.pos) and self._more():
+                pass
+        size = self.size
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+                self.pos = end
+                return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            size *= 2  # big value: read in larger steps so retries stay few
+            self._more(size)
 
-            assignments = data.get("assignments", [])
-            for a in assignments:
-                title = a.get("name", "Untitled Assignment")
-                description = strip_html(a.get("description", ""))
-                summary = f"• {title}: {description[:150]}" if description else f"• {title}"
-                text_blocks.append(summary)
+    def skip(self):
+        """Move past the next value without building it."""
+        c = self.peek()
+        if c not in "[{\"":
+            self.value()
+            return
+        depth = 0
+        while True:
+            m = _SPECIAL.search(self.buf, self.pos)
+            if m is None:
+                self.pos = len(self.buf)
+                if not self._more():
+                    raise ValueError("unexpected end of JSON")
+                continue
+            ch = m.group()
+            if ch == '"':
+                end = _STRING_END.match(self.buf, m.end())
+                if end is None:  # string continues in the next piece
+                    self.pos = m.start()
+                    if not self._more(len(self.buf) + self.size):
+                        raise ValueError("unterminated string")
+                    continue
+                self.pos = end.end()
+            else:
+                self.pos = m.end()
+                depth += 1 if ch in "[{" else -1
+            if depth == 0:
+                return
 
-        except Exception as e:
-            print(f"❌ Could not parse {path.name}: {e}")
+    def items(self):
+        """Walk an array: yields once per element, which the caller must consume."""
+        self._take("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            c = self.peek()
+            self.pos += 1
+            if c == "]":
+                return
+            if c != ",":
+                raise ValueError(f"expected ',' or ']', found {c!r}")
+
+    def members(self):
+        """Walk an object: yields each key; the caller must consume its value."""
+        self._take("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self._take(":")
+            yield key
+            c = self.peek()
+            self.pos += 1
+            if c == "}":
+                return
+            if c != ",":
+                raise ValueError(f"expected ',' or '}}', found {c!r}")
+
+# ---------------- Course records ----------------
+# section -> (record kind, title field, html field)
+SECTIONS = {
+    "assignments": ("assignment", "name", "description"),
+    "pages": ("page", "title", "body"),
+    "discussions": ("discussion", "title", "message"),
+}
+
+def _module_records(r):
+    name, items = "", []
+    for key in r.members():
+        if key == "name":
+            name = r.value() or ""
+        elif key == "items" and r.peek() == "[":
+            for _ in r.items():
+                if r.peek() != "{":
+                    r.skip()
+                    continue
+                title, kind = "", ""
+                for field in r.members():
+                    if field == "title":
+                        title = r.value() or ""
+                    elif field == "type":
+                        kind = r.value() or ""
+                    else:
+                        r.skip()  # embedded page/assignment copies are covered by their own sections
+                items.append((title, kind))
+        else:
+            r.skip()
+    for title, kind in items:
+        yield {"kind": "module_item", "title": f"{name} / {title}", "text": kind}
+
+def iter_course_records(path):
+    """{"kind", "title", "text"} records of an exported course JSON (app.write_course_json), read
+    incrementally: one section element at a time is in memory, never the whole document.
+    The course name comes as a record of kind "course"."""
+    with open(path, "r", encoding="utf-8") as f:
+        r = JsonStream(f)
+        for key in r.members():
+            if key == "name":
+                yield {"kind": "course", "title": r.value() or "Unknown Course", "text": ""}
+            elif key in SECTIONS and r.peek() == "[":
+                kind, title_field, html_field = SECTIONS[key]
+                for _ in r.items():
+                    x = r.value()
+                    if isinstance(x, dict):
+                        yield {"kind": kind, "title": x.get(title_field) or f"Untitled {kind.title()}",
+                               "text": html_to_text(x.get(html_field) or "")}
+            elif key == "modules" and r.peek() == "[":
+                for _ in r.items():
+                    if r.peek() == "{":
+                        yield from _module_records(r)
+                    else:
+                        r.skip()
+            else:
+                r.skip()
+
+_LABELS = {"assignment": "", "page": "Page: ", "discussion": "Discussion: ", "module_item": "Module item: "}
+
+def load_json_file(path):
+    text_blocks = []
+    course_name = "Unknown Course"
+    print(f"📂 Parsing: {Path(path).name}")
+    for rec in iter_course_records(path):  # errors propagate, so a failed parse is never cached as empty
+        if rec["kind"] == "course":
+            course_name = rec["title"]
             continue
+        label = _LABELS[rec["kind"]] + rec["title"]
+        text_blocks.append(f"• {label}: {rec['text']}" if rec["text"] else f"• {label}")
+
+    return [f"📘 {course_name}"] + text_blocks
+
+def load_json_files(paths):
+    """Blocks of each file, parsed in parallel (and cached while a file is unchanged); [] for a file that fails."""
+    out = []
+    for path, blocks, err in extract_many("json", [str(p) for p in paths], load_json_file):
+        if err is not None:
+            print(f"❌ Could not parse {Path(path).name}: {err}")
+        out.append(blocks or [])
+    return out
 
+def load_json_from_folder(folder="json"):
+    text_blocks = []
+    for blocks in load_json_files(sorted(Path(folder).glob("*.json"))):
+        text_blocks.extend(blocks)
     return text_blocks
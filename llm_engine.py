@@ -1,17 +1,137 @@
 import os
-from openai import OpenAI
+import asyncio
+import weakref
+import httpx
+from typing import Any, AsyncIterator, Dict, List, Optional
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
+from tokens import count_tokens
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai").lower()  # openai | fake
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o")
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "16"))  # model calls in flight per worker
+LLM_FAKE_DELAY = float(os.getenv("LLM_FAKE_DELAY", "0.01"))  # seconds per token of the fake backend
+
+SYSTEM_PROMPT = "You are a helpful tutor who only answers based on the course materials provided."
+
+# The prompt is system, then course material, then the question: everything before the question is
+# shared by questions that retrieve the same chunks, so the provider can serve it from its prompt cache.
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+PROMPT_HEAD = "Here is the course material:\n"
+PROMPT_TAIL = "\n\nNow answer this question:\n"
+MESSAGE_OVERHEAD = 3  # tokens the chat format adds per message
+_prompt_overhead: Optional[int] = None
+
+def build_messages(question, context):
+    return [
+        SYSTEM_MESSAGE,
+        {"role": "user", "content": PROMPT_HEAD + context + PROMPT_TAIL + question}
+    ]
+
+def prompt_tokens(question, context_tokens):
+    """Prompt size of build_messages(question, context) given the context's token count."""
+    global _prompt_overhead
+    if _prompt_overhead is None:  # counted on first use: counting loads the tokenizer
+        _prompt_overhead = count_tokens(SYSTEM_PROMPT) + count_tokens(PROMPT_HEAD) + count_tokens(PROMPT_TAIL) + 2 * MESSAGE_OVERHEAD + 3
+    return _prompt_overhead + context_tokens + count_tokens(question)
+
+_client: Optional[OpenAI] = None
+
+def get_client() -> OpenAI:
+    """The sync OpenAI client, created on first use so that importing this module (LLM_BACKEND=fake,
+    tests) needs no API key."""
+    global _client
+    if _client is None:
+        _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
 
 def ask_llm(question, context):
-    prompt = f"Here is the course material:\n{context}\n\nNow answer this question:\n{question}"
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": "You are a helpful tutor who only answers based on the course materials provided."},
-            {"role": "user", "content": prompt}
-        ]
+    response = get_client().chat.completions.create(
+        model=LLM_MODEL,
+        messages=build_messages(question, context)
     )
     return response.choices[0].message.content
+
+
+# ---------------- Async engine ----------------
+class OpenAIBackend:
+    """Streams chat completions over one pooled connection set per event loop."""
+    def __init__(self, model: str = LLM_MODEL, max_connections: int = LLM_CONCURRENCY) -> None:
+        self.model = model
+        self.max_connections = max_connections
+        self.clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+    def _client(self) -> AsyncOpenAI:
+        loop = asyncio.get_running_loop()
+        c = self.clients.get(loop)
+        if c is None:
+            http = httpx.AsyncClient(limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                                     timeout=httpx.Timeout(120, connect=10))
+            c = self.clients[loop] = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http)
+        return c
+
+    async def stream(self, messages: List[Dict[str, str]], usage: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        stream = await self._client().chat.completions.create(model=self.model, messages=messages, stream=True,
+                                                              stream_options={"include_usage": True})
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            if chunk.usage is not None and usage is not None:  # last chunk
+                details = getattr(chunk.usage, "prompt_tokens_details", None)
+                usage.update({"prompt_tokens": chunk.usage.prompt_tokens, "completion_tokens": chunk.usage.completion_tokens,
+                              "cached_tokens": getattr(details, "cached_tokens", None) or 0})
+
+
+class FakeBackend:
+    """Local stand-in for tests and load runs: a deterministic answer built from the prompt,
+    one word every `delay` seconds."""
+    def __init__(self, delay: float = LLM_FAKE_DELAY) -> None:
+        self.delay = delay
+        self.calls = 0
+
+    async def stream(self, messages: List[Dict[str, str]], usage: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        self.calls += 1
+        prompt = messages[-1]["content"]
+        material, _, question = prompt.rpartition("\n\nNow answer this question:\n")
+        material = material.replace("Here is the course material:\n", "", 1)
+        answer = f"Answer to {question.strip()!r} from {len(material)} characters of course material: {' '.join(material.split()[:40])}"
+        for i, word in enumerate(answer.split(" ")):
+            if self.delay: await asyncio.sleep(self.delay)
+            yield word if i == 0 else " " + word
+        if usage is not None:
+            usage.update({"prompt_tokens": sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD for m in messages) + 3,
+                          "completion_tokens": count_tokens(answer), "cached_tokens": 0})
+
+
+class AsyncLLM:
+    """Non-blocking model calls for the chat routes, at most `concurrency` at a time per event loop."""
+    def __init__(self, backend, concurrency: int = LLM_CONCURRENCY) -> None:
+        self.backend = backend
+        self.concurrency = max(1, concurrency)
+        self.sems: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self.in_flight = 0
+
+    def _sem(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if loop not in self.sems: self.sems[loop] = asyncio.Semaphore(self.concurrency)
+        return self.sems[loop]
+
+    async def stream(self, question: str, context: str, usage: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Answer text as it is generated; the concurrency slot is held until the stream ends.
+        usage, when given, receives the model's prompt/completion/cached token counts at the end."""
+        async with self._sem():
+            self.in_flight += 1
+            try:
+                async for delta in self.backend.stream(build_messages(question, context), usage):
+                    yield delta
+            finally:
+                self.in_flight -= 1
+
+    async def ask(self, question: str, context: str, usage: Optional[Dict[str, Any]] = None) -> str:
+        return "".join([d async for d in self.stream(question, context, usage)])
+
+
+def make_llm(kind: str = LLM_BACKEND) -> AsyncLLM:
+    return AsyncLLM(FakeBackend() if kind == "fake" else OpenAIBackend())
@@ -1,37 +1,58 @@
-from fastapi import FastAPI, Request
-from canvas_parser import load_all_texts_from_folder
-from json_parser import load_json_from_folder
-from llm_engine import ask_llm
-from ppt_parser import load_all_ppts
+import os
+import json
+import asyncio
+from typing import List
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import StreamingResponse
+from llm_engine import make_llm, prompt_tokens
+from tokens import exact
+from chat_context import ChatContext
+from embedding_store import EmbeddingStore, make_embedder
+from answer_cache import AnswerCache, normalize_question
 
 
 from pydantic import BaseModel
 
 class ChatRequest(BaseModel):
     question: str
+    stream: bool = False  # answer as server-sent events while it is generated
+
+class ChatBatchRequest(BaseModel):
+    questions: List[str]
 
 app = FastAPI()
 
+CHAT_BATCH_MAX = int(os.getenv("CHAT_BATCH_MAX", "200"))                # questions per /chat/batch call
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "8"))  # model calls one batch runs at once
+
+# Optional embedding index next to BM25 (EMBEDDING_BACKEND=hash|openai); vectors persist across restarts
+embedder = make_embedder()
+embedding_store = EmbeddingStore(embedder) if embedder else None
+
+context = ChatContext(dense=embedding_store.sync if embedding_store else None)
+
+# Answers are reused per (question, corpus version); a new or changed file invalidates them
+answers = AnswerCache()
+
+# Async model client (LLM_BACKEND=openai|fake), capped at LLM_CONCURRENCY calls per worker
+llm = make_llm()
+
 
 
 @app.on_event("startup")
 def load_context():
-    print("🔄 Loading context from data and json folders...")
+    # Parsing runs in the background so the server is ready at once; /ready says when /chat can answer
+    print("🔄 Loading course material in the background...")
+    context.start()
 
-    pdf_chunks = load_all_texts_from_folder("data")
-    json_chunks = load_json_from_folder("json")
-    ppt_chunks = load_all_ppts("ppt")
+@app.get("/ready")
+def ready():
+    return context.status()
 
-    # Load only a few entries to minimize token use
-    pdf_text = "\n\n".join(c["content"] for c in pdf_chunks[:3])  # up to 3 PDFs
-    json_text = "\n".join(json_chunks[:10])  # up to 10 JSON entries
-    ppt_text = "\n".join(c["content"] for c in ppt_chunks[:2])  # cap to 2 PPTs
-
-    global all_context
-    all_context = (pdf_text + "\n" + json_text + "\n" + ppt_text).strip()
-    print(f"✅ Final combined context loaded ({len(all_context)} characters)")
-    print(all_context[:500])  # Debug: show the beginning of the context
-    print("---------------------------------------------------")
+@app.post("/reload")
+def reload_context(force: bool = False):
+    """Pick up added, changed or removed files now instead of at the next poll."""
+    return context.reload(force=force)
 
 @app.post("/chat")
 async def chat(payload: ChatRequest):
@@ -40,6 +61,101 @@ async def chat(payload: ChatRequest):
     if not question:
         return {"error": "No question provided"}
 
-    # Use combined global context from both PDF and JSON
-    answer = ask_llm(question, all_context[:60000])  # limit characters for token safety
-    return {"answer": answer}
+    snap = context.current  # read once: the index and its version must belong together
+    if snap is None:
+        raise HTTPException(status_code=503, detail="Course material is still loading", headers={"Retry-After": "5"})
+
+    if payload.stream:
+        return StreamingResponse(stream_answer(question, snap.retriever, snap.fingerprint), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    return await answer_question(question, snap.retriever, snap.fingerprint)
+
+@app.post("/chat/batch")
+async def chat_batch(payload: ChatBatchRequest):
+    """Many questions in one call: retrieval for all of them in one pass, identical questions
+    answered once, model calls fanned out at most CHAT_BATCH_CONCURRENCY at a time. Results come
+    back in the order asked, each with either an answer or an error."""
+    questions = payload.questions
+    if not questions:
+        return {"results": []}
+    if len(questions) > CHAT_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {CHAT_BATCH_MAX} questions per batch")
+
+    snap = context.current
+    if snap is None:
+        raise HTTPException(status_code=503, detail="Course material is still loading", headers={"Retry-After": "5"})
+
+    retriever, version = snap.retriever, snap.fingerprint
+    unique = list(dict.fromkeys(normalize_question(q) for q in questions if q.strip()))
+    first = {}
+    for q in questions:
+        if q.strip(): first.setdefault(normalize_question(q), q)
+    # Retrieval may embed the questions (a blocking HTTP call with EMBEDDING_BACKEND=openai): keep it off the event loop
+    retrieved = dict(zip(unique, await asyncio.to_thread(retriever.contexts_for, [first[n] for n in unique])))
+    limit = asyncio.Semaphore(CHAT_BATCH_CONCURRENCY)
+
+    async def one(normalized):
+        async with limit:
+            try:
+                return await answer_question(first[normalized], retriever, version, retrieved[normalized])
+            except Exception as e:
+                return {"error": str(e)}
+
+    answered = dict(zip(unique, await asyncio.gather(*(one(n) for n in unique))))
+    results = [{"question": q, **answered[normalize_question(q)]} if q.strip() else {"question": q, "error": "No question provided"}
+               for q in questions]
+    return {"results": results, "unique_questions": len(unique),
+            "unique_contexts": len({id(r[0]) for r in retrieved.values()})}
+
+async def answer_question(question, retriever, version, retrieved=None):
+    """Cached answer to one question; retrieved is its (context, chunks, usage) when already looked up."""
+    async def answer():
+        # Only the chunks relevant to this question are sent, packed into the token budget
+        context_text, used, usage = retrieved or await asyncio.to_thread(retriever.context_for, question)
+        model_usage = {}
+        answer = await llm.ask(question, context_text, model_usage)
+        return {"answer": answer, "sources": sources(used), "usage": token_usage(question, usage, model_usage)}
+
+    result, how = await answers.get_or_compute(question, version, answer)
+    if how != "miss":  # nothing was spent on this request
+        result = {**result, "usage": {**result["usage"], "model": None}}
+    return {**result, "cache": how}
+
+def sources(used):
+    return [{"title": c["title"], "kind": c["kind"], "score": c["score"]} for c in used]
+
+def token_usage(question, usage, model_usage):
+    """Our count of the prompt (exact with tiktoken, an estimate otherwise) next to what the model reported."""
+    return {**usage, "prompt_tokens": prompt_tokens(question, usage["context_tokens"]), "exact": exact(),
+            "model": model_usage or None}
+
+def sse(data, event=None):
+    return (f"event: {event}\n" if event else "") + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def stream_answer(question, retriever, version):
+    """SSE: a "sources" event, "delta" events with the answer text, then "done" with the token usage (or "error")."""
+    how, cached = answers.lookup(question, version)
+    if how is not None:
+        yield sse(cached["sources"], "sources")
+        yield sse({"text": cached["answer"]}, "delta")
+        yield sse({"cache": how, "usage": {**cached["usage"], "model": None}}, "done")
+        return
+    context_text, used, usage = await asyncio.to_thread(retriever.context_for, question)
+    yield sse(sources(used), "sources")
+    parts, model_usage = [], {}
+    try:
+        async for delta in llm.stream(question, context_text, model_usage):
+            parts.append(delta)
+            yield sse({"text": delta}, "delta")
+    except Exception as e:
+        yield sse({"detail": str(e)}, "error")
+        return
+    usage = token_usage(question, usage, model_usage)
+    answers.store(question, version, {"answer": "".join(parts), "sources": sources(used), "usage": usage})
+    yield sse({"cache": "miss", "usage": usage}, "done")
+
+@app.get("/chat/index")
+def chat_index():
+    return {**context.status(), "embeddings": embedding_store.stats() if embedding_store else None,
+            "answers": answers.stats(), "llm_in_flight": llm.in_flight}
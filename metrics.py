@@ -0,0 +1,154 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+PREFIX = "canvas_"
+
+# short name -> help; counters are exposed as canvas_<name>_total
+COUNTERS = {
+    "api_calls": "Canvas API requests sent, by HTTP status",
+    "api_retries": "Canvas API requests repeated after a 403 Rate Limit Exceeded",
+    "throttle_sleeps": "Requests held back by the rate governor",
+    "throttle_seconds": "Seconds requests spent held back by the rate governor",
+    "response_cache_hits": "Canvas GETs answered from the response cache, by how (fresh or revalidated)",
+    "blob_cache_hits": "File downloads served from the blob cache",
+    "downloads": "Files downloaded (or taken from the blob cache)",
+    "download_bytes": "Bytes of downloaded files",
+    "download_retries": "File downloads retried after an error",
+    "download_failures": "File downloads given up on",
+    "http_requests": "Requests served by this app, by route and status",
+}
+PHASE_HELP = "Seconds spent per export phase"
+HTTP_SECONDS_HELP = "Seconds until the response started, by route"
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, str, str, Dict[str, Any], float]  # (name, type, help, labels, value)
+
+
+class Timings:
+    """Phase durations and counters of one export, for the optional timing summary in its response."""
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.phases: Dict[str, List[float]] = {}  # phase -> [count, seconds, max]
+        self.counters: Dict[str, float] = {}
+
+    def add_phase(self, phase: str, seconds: float) -> None:
+        with self.lock:
+            p = self.phases.setdefault(phase, [0, 0.0, 0.0])
+            p[0] += 1; p[1] += seconds; p[2] = max(p[2], seconds)
+
+    def add(self, name: str, value: float) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> Dict[str, Any]:
+        """Phases overlap (sections, courses and downloads run concurrently), so their seconds can add
+        up to more than total_seconds."""
+        with self.lock:
+            return {
+                "total_seconds": round(time.perf_counter() - self.start, 3),
+                "phases": {k: {"count": int(c), "seconds": round(s, 3), "max_seconds": round(m, 3)}
+                           for k, (c, s, m) in sorted(self.phases.items(), key=lambda kv: -kv[1][1])},
+                "counters": {k: round(v, 3) for k, v in sorted(self.counters.items())},
+            }
+
+
+_current: "contextvars.ContextVar[Optional[Timings]]" = contextvars.ContextVar("export_timings", default=None)
+
+
+class Metrics:
+    """Process-wide counters and phase timings, rendered in the Prometheus text format.
+    Whatever is recorded while a Timings is active (see recording) is also added to it."""
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.summaries: Dict[Tuple[str, Labels], List[float]] = {}  # -> [count, sum]
+        self.collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+        t = _current.get()
+        if t is not None: t.add(name, value)
+
+    def observe(self, phase: str, seconds: float) -> None:
+        self._summary("phase_seconds", (("phase", phase),), seconds)
+        t = _current.get()
+        if t is not None: t.add_phase(phase, seconds)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float) -> None:
+        self.inc("http_requests", method=method, route=route, status=status)
+        self._summary("http_request_seconds", (("method", method), ("route", route)), seconds)
+
+    def _summary(self, name: str, labels: Labels, seconds: float) -> None:
+        with self.lock:
+            s = self.summaries.setdefault((name, labels), [0, 0.0])
+            s[0] += 1; s[1] += seconds
+
+    @contextmanager
+    def span(self, phase: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start)
+
+    def register(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """collector() is called on every scrape and returns gauges/counters owned elsewhere."""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            summaries = sorted(self.summaries.items())
+        seen = set()
+        for (name, labels), value in counters:
+            full = f"{PREFIX}{name}_total"
+            if full not in seen:
+                seen.add(full)
+                lines += [f"# HELP {full} {COUNTERS.get(name, name)}", f"# TYPE {full} counter"]
+            lines.append(f"{full}{_labels(labels)} {_num(value)}")
+        for (name, labels), (count, total) in summaries:
+            full = PREFIX + name
+            if full not in seen:
+                seen.add(full)
+                lines += [f"# HELP {full} {PHASE_HELP if name == 'phase_seconds' else HTTP_SECONDS_HELP}", f"# TYPE {full} summary"]
+            lines += [f"{full}_sum{_labels(labels)} {_num(total)}", f"{full}_count{_labels(labels)} {_num(count)}"]
+        for collector in self.collectors:
+            for name, kind, help_, labels, value in collector():
+                full = PREFIX + name
+                if full not in seen:
+                    seen.add(full)
+                    lines += [f"# HELP {full} {help_}", f"# TYPE {full} {kind}"]
+                lines.append(f"{full}{_labels(tuple(sorted((k, str(v)) for k, v in labels.items())))} {_num(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Labels) -> str:
+    if not labels: return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels) + "}"
+
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(round(v, 6))
+
+
+@contextmanager
+def recording(timings: Optional[Timings]) -> Iterator[Optional[Timings]]:
+    """Make timings the collector for this context (asyncio tasks and asyncio.to_thread calls
+    inherit it)."""
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        try: _current.reset(token)
+        except ValueError: _current.set(None)  # generator finished in another context
+
+
+metrics = Metrics()
@@ -0,0 +1,329 @@
+"""Local stand-in for the Canvas REST API, used by bench.py and for offline runs of app.py.
+
+    python mock_canvas.py --port 8001 --courses 4 --latency-ms 40
+
+then use api_base http://127.0.0.1:8001/api/v1 with any token (tokens starting with "invalid" get a 401).
+Courses are synthetic and deterministic for a given set of sizes. Collections paginate with Link
+headers like Canvas does, every request is delayed by the configured latency, and each token draws
+on a leaky-bucket quota that answers 403 Rate Limit Exceeded when it runs dry. As on Canvas, an open
+request holds a pre-flight charge against the quota until it finishes and is settled to its cost."""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+
+DEFAULTS: Dict[str, Any] = {
+    "courses": 3,
+    "assignments": 120,       # per course
+    "pages": 40,
+    "files": 30,
+    "discussions": 15,
+    "quizzes": 8,
+    "modules": 6,
+    "items_per_module": 12,
+    "body_bytes": 2000,       # html in each page body / assignment description
+    "file_bytes": 65536,
+    "links_per_page": 2,      # instructure_file_link anchors in each page body
+    "latency_ms": 20.0,
+    "jitter": 0.2,            # +- fraction of latency
+    "rate_capacity": 700.0,   # Canvas-like quota per token
+    "rate_refill": 10.0,      # units per second
+    "request_cost": 1.0,
+    "preflight_cost": 50.0,   # held against the quota while a request is open
+    "max_inline_items": 100,  # modules with more items omit "items" under include[]=items
+    "seed": 1,
+}
+
+
+class MockCanvas:
+    def __init__(self, **overrides: Any) -> None:
+        self.cfg = {**DEFAULTS, **{k: v for k, v in overrides.items() if v is not None}}
+        self.rng = random.Random(self.cfg["seed"])
+        self.lock = threading.Lock()
+        self.buckets: Dict[str, Tuple[float, float]] = {}  # token -> (level, at)
+        self.reset_stats()
+        self._build()
+        self.app = self._routes()
+
+    # ---------------- data ----------------
+    def _build(self) -> None:
+        c = self.cfg
+        filler = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * (c["body_bytes"] // 56 + 1))[:c["body_bytes"]]
+        self.courses: List[Dict[str, Any]] = []
+        self.sections: Dict[Tuple[int, str], List[Dict[str, Any]]] = {}
+        self.files: Dict[int, Dict[str, Any]] = {}
+        for n in range(c["courses"]):
+            cid = 101 + n
+            stamp = f"2024-0{1 + n % 9}-01T00:00:00Z"
+            self.courses.append({"id": cid, "name": f"Course {cid}", "course_code": f"C{cid}",
+                                 "workflow_state": "available", "updated_at": stamp})
+            files = [{"id": cid * 10000 + i, "display_name": f"file_{i}.{('pdf', 'txt', 'docx')[i % 3]}",
+                      "filename": f"file_{i}", "content-type": "application/octet-stream",
+                      "size": c["file_bytes"], "updated_at": stamp} for i in range(c["files"])]
+            for f in files: self.files[f["id"]] = f
+            def links(i: int) -> str:
+                if not files: return ""
+                return "".join(f'<a class="instructure_file_link" href="/courses/{cid}/files/{files[(i + k) % len(files)]["id"]}/download">f</a>'
+                               for k in range(c["links_per_page"]))
+            self.sections[cid, "assignments"] = [
+                {"id": cid * 10000 + i, "name": f"Assignment {i}", "description": f"<p>{filler}</p>", "rubric": [],
+                 "due_at": stamp, "points_possible": 10, "submission_types": ["online_upload"], "updated_at": stamp,
+                 "html_url": f"/courses/{cid}/assignments/{cid * 10000 + i}"} for i in range(c["assignments"])]
+            self.sections[cid, "pages"] = [
+                {"url": f"page-{i}", "title": f"Page {i}", "body": f"<p>{filler}</p>{links(i)}", "updated_at": stamp,
+                 "html_url": f"/courses/{cid}/pages/page-{i}"} for i in range(c["pages"])]
+            self.sections[cid, "files"] = files
+            self.sections[cid, "discussion_topics"] = [
+                {"id": cid * 10000 + i, "title": f"Discussion {i}", "message": f"<p>{filler[:200]}</p>", "updated_at": stamp}
+                for i in range(c["discussions"])]
+            self.sections[cid, "quizzes"] = [
+                {"id": cid * 10000 + i, "title": f"Quiz {i}", "description": "", "updated_at": stamp} for i in range(c["quizzes"])]
+            modules = []
+            for m in range(c["modules"]):
+                items = []
+                for k in range(c["items_per_module"]):
+                    kind = ("Page", "Assignment", "File", "Discussion", "Quiz")[k % 5]
+                    section = {"Page": "pages", "Assignment": "assignments", "File": "files",
+                               "Discussion": "discussion_topics", "Quiz": "quizzes"}[kind]
+                    pool = self.sections[cid, section]
+                    if not pool: continue
+                    obj = pool[(m * c["items_per_module"] + k) % len(pool)]
+                    item: Dict[str, Any] = {"id": cid * 100000 + m * 1000 + k, "module_id": m + 1, "position": k + 1,
+                                            "type": kind, "title": obj.get("title") or obj.get("name") or obj.get("display_name"),
+                                            "content_details": {}}
+                    if kind == "Page":
+                        item["page_url"] = obj["url"]; item["content_details"]["page_url"] = obj["url"]
+                    else:
+                        item["content_id"] = obj["id"]
+                    items.append(item)
+                modules.append({"id": m + 1, "name": f"Module {m + 1}", "position": m + 1, "items_count": len(items), "_items": items})
+            self.sections[cid, "modules"] = modules
+
+    def _file_json(self, f: Dict[str, Any], base: str) -> Dict[str, Any]:
+        return {**f, "url": f"{base}files/{f['id']}/download?verifier=mock"}
+
+    def _file_bytes(self, fid: int) -> bytes:
+        seed = hashlib.sha256(str(fid).encode()).digest()
+        n = self.cfg["file_bytes"]
+        return (seed * (n // len(seed) + 1))[:n]
+
+    # ---------------- accounting ----------------
+    def reset_stats(self) -> None:
+        with self.lock:
+            self.stats: Dict[str, Any] = {"calls": 0, "bytes_sent": 0, "rate_limited": 0, "not_modified": 0,
+                                          "downloads": 0, "by_endpoint": {}}
+            self.buckets.clear()
+
+    def snapshot_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return json.loads(json.dumps(self.stats))
+
+    def _count(self, endpoint: str, nbytes: int, **flags: int) -> None:
+        with self.lock:
+            self.stats["calls"] += 1; self.stats["bytes_sent"] += nbytes
+            self.stats["by_endpoint"][endpoint] = self.stats["by_endpoint"].get(endpoint, 0) + 1
+            for k, v in flags.items(): self.stats[k] += v
+
+    def _charge(self, token: str, amount: float, check: bool = False) -> Tuple[bool, float]:
+        """(allowed, remaining quota) after taking amount from token's bucket (a negative amount gives
+        back). With check, a charge that would overdraw the bucket is refused and nothing is taken."""
+        cap, refill = self.cfg["rate_capacity"], self.cfg["rate_refill"]
+        with self.lock:
+            now = time.monotonic()
+            level, at = self.buckets.get(token, (cap, now))
+            level = min(cap, level + (now - at) * refill)
+            allowed = not check or level - amount >= 0
+            if allowed: level -= amount
+            self.buckets[token] = (level, now)
+            return allowed, level
+
+    async def _delay(self) -> None:
+        ms = self.cfg["latency_ms"]
+        if ms > 0:
+            await asyncio.sleep(ms / 1000 * (1 + self.cfg["jitter"] * (2 * self.rng.random() - 1)))
+
+    async def _respond(self, request: Request, endpoint: str, payload: Any,
+                       headers: Optional[Dict[str, str]] = None) -> Response:
+        auth = request.headers.get("authorization", "")
+        token = auth[7:] if auth.lower().startswith("bearer ") else ""
+        if not token or token.startswith("invalid"):
+            await self._delay()
+            body = b'{"errors":[{"message":"Invalid access token."}]}'
+            self._count(endpoint, len(body))
+            return Response(body, status_code=401, media_type="application/json")
+        preflight, cost = self.cfg["preflight_cost"], self.cfg["request_cost"]
+        allowed, remaining = self._charge(token, max(preflight, cost), check=True)
+        if not allowed:
+            body = b"403 Forbidden (Rate Limit Exceeded)"
+            self._count(endpoint, len(body), rate_limited=1)
+            return Response(body, status_code=403, headers={"X-Rate-Limit-Remaining": f"{remaining:.1f}"}, media_type="text/plain")
+        await self._delay()  # the pre-flight charge is held while the request is open
+        _, remaining = self._charge(token, cost - max(preflight, cost))
+        rate = {"X-Rate-Limit-Remaining": f"{remaining:.1f}", "X-Request-Cost": f"{cost:.1f}"}
+        if payload is None:
+            body = b'{"errors":[{"message":"The specified resource does not exist."}]}'
+            self._count(endpoint, len(body))
+            return Response(body, status_code=404, headers=rate, media_type="application/json")
+        body = json.dumps(payload).encode()
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        out = {**rate, **(headers or {}), "ETag": etag}
+        if request.headers.get("if-none-match") == etag:
+            self._count(endpoint, 0, not_modified=1)
+            return Response(status_code=304, headers=out)
+        self._count(endpoint, len(body))
+        return Response(body, headers=out, media_type="application/json")
+
+    async def _paginate(self, request: Request, endpoint: str, items: List[Any]) -> Response:
+        q = request.query_params
+        per_page = max(1, min(100, int(q.get("per_page") or 10)))
+        page = max(1, int(q.get("page") or 1))
+        last = max(1, -(-len(items) // per_page))
+        base = str(request.url).split("?")[0]
+        keep = [(k, v) for k, v in q.multi_items() if k != "page"]
+        link = lambda p, rel: f'<{base}?{urlencode(keep + [("page", str(p))])}>; rel="{rel}"'
+        rels = [link(page, "current")]
+        if page < last: rels.append(link(page + 1, "next"))
+        if page > 1: rels.append(link(page - 1, "prev"))
+        rels += [link(1, "first"), link(last, "last")]
+        chunk = items[(page - 1) * per_page: page * per_page]
+        return await self._respond(request, endpoint, chunk, {"Link": ",".join(rels)})
+
+    # ---------------- routes ----------------
+    def _routes(self) -> FastAPI:
+        app = FastAPI(title="Mock Canvas")
+        api = "/api/v1"
+
+        @app.get(api + "/users/self")
+        async def user_self(request: Request):
+            return await self._respond(request, "users/self", {"id": 1, "name": "Bench User"})
+
+        @app.get(api + "/users/self/courses")
+        async def courses(request: Request):
+            return await self._paginate(request, "courses", self.courses)
+
+        @app.get(api + "/courses/{cid}")
+        async def course(request: Request, cid: int):
+            c = next((c for c in self.courses if c["id"] == cid), None)
+            return await self._respond(request, "course", c and {**c, "syllabus_body": "<p>syllabus</p>"})
+
+        @app.get(api + "/courses/{cid}/assignments")
+        async def assignments(request: Request, cid: int):
+            drop = set(request.query_params.getlist("exclude_response_fields[]"))
+            xs = [{k: v for k, v in a.items() if k not in drop} for a in self.sections.get((cid, "assignments"), [])]
+            return await self._paginate(request, "assignments", xs)
+
+        @app.get(api + "/courses/{cid}/pages")
+        async def pages(request: Request, cid: int):
+            body = "body" in request.query_params.getlist("include[]")
+            xs = [p if body else {k: v for k, v in p.items() if k != "body"} for p in self.sections.get((cid, "pages"), [])]
+            return await self._paginate(request, "pages", xs)
+
+        @app.get(api + "/courses/{cid}/pages/{url}")
+        async def page(request: Request, cid: int, url: str):
+            return await self._respond(request, "page", next((p for p in self.sections.get((cid, "pages"), []) if p["url"] == url), None))
+
+        @app.get(api + "/courses/{cid}/modules")
+        async def modules(request: Request, cid: int):
+            inline = "items" in request.query_params.getlist("include[]")
+            xs = []
+            for m in self.sections.get((cid, "modules"), []):
+                out = {k: v for k, v in m.items() if k != "_items"}
+                if inline and len(m["_items"]) <= self.cfg["max_inline_items"]: out["items"] = m["_items"]
+                xs.append(out)
+            return await self._paginate(request, "modules", xs)
+
+        @app.get(api + "/courses/{cid}/modules/{mid}/items")
+        async def module_items(request: Request, cid: int, mid: int):
+            m = next((m for m in self.sections.get((cid, "modules"), []) if m["id"] == mid), None)
+            return await self._paginate(request, "module_items", m["_items"] if m else [])
+
+        @app.get(api + "/courses/{cid}/files")
+        async def files(request: Request, cid: int):
+            base = str(request.base_url) + "api/v1/"
+            return await self._paginate(request, "files", [self._file_json(f, base) for f in self.sections.get((cid, "files"), [])])
+
+        @app.get(api + "/files/{fid}")
+        async def file(request: Request, fid: int):
+            f = self.files.get(fid)
+            return await self._respond(request, "file", f and self._file_json(f, str(request.base_url) + "api/v1/"))
+
+        @app.get(api + "/files/{fid}/download")
+        async def download(request: Request, fid: int):
+            await self._delay()
+            if fid not in self.files: return Response(status_code=404)
+            data = self._file_bytes(fid)
+            start, status = 0, 200
+            rng = request.headers.get("range", "")
+            if rng.startswith("bytes="):
+                start = int(rng[6:].split("-")[0] or 0)
+                if start >= len(data): return Response(status_code=416)
+                status = 206
+            self._count("download", len(data) - start, downloads=1)
+            headers = {"Content-Range": f"bytes {start}-{len(data) - 1}/{len(data)}"} if status == 206 else {}
+            return Response(data[start:], status_code=status, headers=headers, media_type="application/octet-stream")
+
+        @app.get(api + "/courses/{cid}/discussion_topics")
+        async def discussions(request: Request, cid: int):
+            return await self._paginate(request, "discussions", self.sections.get((cid, "discussion_topics"), []))
+
+        @app.get(api + "/courses/{cid}/discussion_topics/{tid}")
+        async def discussion(request: Request, cid: int, tid: int):
+            return await self._respond(request, "discussion", next((d for d in self.sections.get((cid, "discussion_topics"), []) if d["id"] == tid), None))
+
+        @app.get(api + "/courses/{cid}/quizzes")
+        async def quizzes(request: Request, cid: int):
+            return await self._paginate(request, "quizzes", self.sections.get((cid, "quizzes"), []))
+
+        @app.get(api + "/courses/{cid}/quizzes/{qid}")
+        async def quiz(request: Request, cid: int, qid: int):
+            return await self._respond(request, "quiz", next((x for x in self.sections.get((cid, "quizzes"), []) if x["id"] == qid), None))
+
+        @app.get("/__stats")
+        def stats():
+            return self.snapshot_stats()
+
+        @app.post("/__reset")
+        def reset():
+            self.reset_stats()
+            return {"ok": True}
+
+        return app
+
+
+def start_background(mock: MockCanvas, host: str = "127.0.0.1", port: int = 0) -> Tuple[Any, str]:
+    """Serve mock on a daemon thread. Returns (uvicorn server, api_base); port 0 picks a free port."""
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(mock.app, host=host, port=port, log_level="warning", access_log=False))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.02)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, f"http://{host}:{port}/api/v1"
+
+
+def add_size_args(p: argparse.ArgumentParser) -> None:
+    for key, default in DEFAULTS.items():
+        p.add_argument("--" + key.replace("_", "-"), type=type(default), default=None, help=f"default {default}")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Serve a synthetic Canvas API.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8001)
+    add_size_args(p)
+    args = vars(p.parse_args())
+    host, port = args.pop("host"), args.pop("port")
+    import uvicorn
+    uvicorn.run(MockCanvas(**args).app, host=host, port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
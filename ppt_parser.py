@@ -1,10 +1,10 @@
 from pptx import Presentation
 from pathlib import Path
+from extraction import extract_many
 
-def extract_text_from_ppt(ppt_path):
+def iter_ppt_slides(ppt_path):
+    """(slide number, text) of every slide that has text."""
     prs = Presentation(ppt_path)
-    slides_text = []
-
     for i, slide in enumerate(prs.slides, 1):
         text_items = []
         for shape in slide.shapes:
@@ -12,27 +12,29 @@ def extract_text_from_ppt(ppt_path):
                 text = shape.text.strip()
                 if text:
                     text_items.append(text)
-
         if text_items:
-            slide_text = "\n".join(text_items)
-            print(f"slide_text: {slide_text}")
-            slides_text.append(f"📄 Slide {i} ({ppt_path.name}):\n{slide_text}")
+            yield i, "\n".join(text_items)
 
-    return "\n\n".join(slides_text)
-
-def load_all_ppts(folder="pptx"):
-    all_text = []
+def ppt_slides(ppt_path):
+    name = Path(ppt_path).name
+    return [f"📄 Slide {i} ({name}):\n{text}" for i, text in iter_ppt_slides(ppt_path)]
 
-    for path in Path(folder).glob("*.pptx"):
-        try:
-            print(f"🖼️ Loading PowerPoint: {path.name}")
-            text = extract_text_from_ppt(path)
-            if text.strip():
-                all_text.append({
-                    "filename": path.name,
-                    "content": text.strip()
-                })
-        except Exception as e:
-            print(f"❌ Failed to parse {path.name}: {e}")
+def extract_text_from_ppt(ppt_path):
+    return "\n\n".join(ppt_slides(ppt_path))
 
+def load_ppts(paths):
+    all_text = []
+    for path, slides, err in extract_many("pptx", [str(p) for p in paths], ppt_slides):
+        if err is not None:
+            print(f"❌ Failed to parse {Path(path).name}: {err}")
+            continue
+        text = "\n\n".join(slides)
+        if text.strip():
+            all_text.append({
+                "filename": Path(path).name,
+                "content": text.strip()
+            })
     return all_text
+
+def load_all_ppts(folder="pptx"):
+    return load_ppts(sorted(Path(folder).glob("*.pptx")))
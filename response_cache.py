@@ -0,0 +1,189 @@
+import os
+import re
+import json
+import time
+import tempfile
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlencode
+from typing import Any, Dict, List, Optional, Tuple
+
+from storage import private_dir
+
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "memory").lower()  # memory | disk | off
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "canvas_response_cache")
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 ** 2)))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))  # seconds served without asking Canvas
+
+# (path pattern, ttl) checked in order, first match wins. After the ttl an entry is revalidated
+# with If-None-Match, so a longer ttl only saves the (cheap) 304 round trip.
+DEFAULT_TTLS: List[Tuple[str, float]] = [
+    (r"/users/self$", 300),
+    (r"/users/self/courses$", 120),
+    (r"/courses/\d+$", 300),
+]
+
+# headers a replayed response needs: pagination, revalidation, decoding
+KEPT_HEADERS = ("Link", "ETag", "Content-Type")
+
+
+class MemoryBackend:
+    """LRU of entries, bounded by total body size."""
+    blocking = False  # calls are cheap enough to make on the event loop
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.size = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(key)
+        if entry is not None: self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        old = self.entries.pop(key, None)
+        if old is not None: self.size -= len(old["body"])
+        self.entries[key] = entry; self.size += len(entry["body"])
+        while self.size > self.max_bytes and self.entries:
+            _, dropped = self.entries.popitem(last=False)
+            self.size -= len(dropped["body"])
+
+    def restamp(self, key: str, stored: float) -> None:
+        if key in self.entries: self.entries[key]["stored"] = stored
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class DiskBackend:
+    """One <key>.json (metadata) + <key>.body pair per entry; survives restarts and is shared by workers
+    on the same host. Least recently used entries are removed once the bodies pass max_bytes."""
+    blocking = True  # reads and writes bodies of up to max_bytes / 8: keep off the event loop
+    def __init__(self, root: str = RESPONSE_CACHE_DIR, max_bytes: int = RESPONSE_CACHE_MAX_BYTES) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        private_dir(root)
+        self.sizes: Dict[str, int] = {}
+        for e in os.scandir(root):
+            if e.name.endswith(".body"): self.sizes[e.name[:-5]] = e.stat().st_size
+
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.root, key + ext)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key, ".json"), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            with open(self._path(key, ".body"), "rb") as f:
+                entry["body"] = f.read()
+            os.utime(self._path(key, ".body"))
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        meta = {k: v for k, v in entry.items() if k != "body"}
+        for ext, data, mode in ((".body", entry["body"], "wb"), (".json", json.dumps(meta), "w")):
+            tmp = self._path(key, ext) + ".part"
+            with open(tmp, mode) as f: f.write(data)
+            os.replace(tmp, self._path(key, ext))
+        self.sizes[key] = len(entry["body"])
+        if sum(self.sizes.values()) > self.max_bytes: self._evict()
+
+    def restamp(self, key: str, stored: float) -> None:
+        try:
+            with open(self._path(key, ".json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        meta["stored"] = stored
+        tmp = self._path(key, ".json") + ".part"
+        with open(tmp, "w") as f: json.dump(meta, f)
+        os.replace(tmp, self._path(key, ".json"))
+
+    def _evict(self) -> None:
+        def used(key: str) -> float:
+            try: return os.path.getmtime(self._path(key, ".body"))
+            except OSError: return 0.0
+        total = sum(self.sizes.values())
+        for key in sorted(self.sizes, key=used):
+            if total <= self.max_bytes: break
+            for ext in (".json", ".body"):
+                try: os.remove(self._path(key, ext))
+                except OSError: pass
+            total -= self.sizes.pop(key)
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+
+class ResponseCache:
+    """Short-lived cache of Canvas GET responses, keyed by (token hash, url + params).
+
+    Within an endpoint's ttl an entry is replayed without contacting Canvas; after that it is
+    revalidated with If-None-Match, so an unchanged collection page costs a 304 instead of a body."""
+    def __init__(self, backend: Any = None, ttls: List[Tuple[str, float]] = DEFAULT_TTLS,
+                 default_ttl: float = RESPONSE_CACHE_TTL) -> None:
+        self.backend = backend
+        self.ttls = [(re.compile(p), t) for p, t in ttls]
+        self.default_ttl = default_ttl
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @property
+    def blocking(self) -> bool:
+        """True when lookup/store/refresh do file I/O and async callers should run them in a thread."""
+        return getattr(self.backend, "blocking", False)
+
+    def ttl_for(self, path: str) -> float:
+        for pattern, ttl in self.ttls:
+            if pattern.search(path): return ttl
+        return self.default_ttl
+
+    @staticmethod
+    def key_for(auth: str, url: str, params: Optional[Dict[str, Any]] = None) -> str:
+        query = urlencode(sorted((params or {}).items()), doseq=True)
+        return hashlib.sha256(f"{auth}|{url}|{query}".encode()).hexdigest()
+
+    def lookup(self, auth: str, url: str, path: str, params: Optional[Dict[str, Any]] = None) -> Tuple[Optional[str], Optional[Dict[str, Any]], bool]:
+        """(key, entry, fresh). key is None when caching is off; a stale entry comes back with fresh=False
+        so its ETag can be sent along."""
+        if not self.enabled: return None, None, False
+        key = self.key_for(auth, url, params)
+        with self.lock:
+            entry = self.backend.get(key)
+            if entry is not None and time.time() - entry["stored"] < self.ttl_for(path):
+                self.hits += 1
+                return key, entry, True
+            return key, entry, False
+
+    def store(self, key: Optional[str], url: str, headers: Any, body: bytes) -> None:
+        if key is None: return
+        entry = {"url": url, "stored": time.time(), "etag": headers.get("ETag"),
+                 "headers": {h: headers[h] for h in KEPT_HEADERS if h in headers}, "body": body}
+        with self.lock:
+            self.misses += 1
+            if len(body) <= self.backend.max_bytes // 8: self.backend.put(key, entry)
+
+    def refresh(self, key: str) -> None:
+        """Canvas answered 304 Not Modified: the entry is good for another ttl."""
+        with self.lock:
+            self.revalidated += 1
+            self.backend.restamp(key, time.time())
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"backend": type(self.backend).__name__ if self.enabled else None, "entries": len(self.backend) if self.enabled else 0,
+                    "hits": self.hits, "revalidated": self.revalidated, "misses": self.misses}
+
+
+def make_response_cache(kind: str = RESPONSE_CACHE) -> ResponseCache:
+    backend = {"memory": MemoryBackend, "disk": DiskBackend}.get(kind)
+    return ResponseCache(backend() if backend else None)
@@ -0,0 +1,205 @@
+import os
+import re
+import math
+import heapq
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from tokens import count_tokens
+
+CHUNK_CHARS = int(os.getenv("CHUNK_CHARS", "1200"))          # target chunk size
+CHAT_TOP_K = int(os.getenv("CHAT_TOP_K", "8"))                # chunks sent with each question
+CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "6000"))  # token budget of the context sent
+BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+RRF_K = 60  # reciprocal rank fusion constant when an embedding index is attached
+
+STOPWORDS = frozenset("""a an and are as at be but by can do does for from had has have how i if in into is it its
+me my of on or our so than that the their them then there these they this to was we were what when where which who
+why will with you your""".split())
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_SLIDE = re.compile(r"^📄 Slide (\d+) \((.+?)\):\n", re.M)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+# ---------------- Chunking ----------------
+def chunk_text(text: str, size: int = CHUNK_CHARS) -> List[str]:
+    """Pack paragraphs into chunks of about `size` characters; an oversized paragraph is cut at whitespace."""
+    out: List[str] = []
+    buf: List[str] = []
+    n = 0
+    for para in re.split(r"\n\s*\n", text):
+        para = para.strip()
+        while len(para) > size:
+            cut = para.rfind(" ", 0, size)
+            cut = cut if cut > size // 2 else size
+            pieces, para = para[:cut].strip(), para[cut:].strip()
+            if buf: out.append("\n\n".join(buf)); buf, n = [], 0
+            out.append(pieces)
+        if not para: continue
+        if buf and n + len(para) > size:
+            out.append("\n\n".join(buf)); buf, n = [], 0
+        buf.append(para); n += len(para) + 2
+    if buf: out.append("\n\n".join(buf))
+    return out
+
+
+def _chunk(source: str, kind: str, title: str, text: str, seq: int) -> Dict[str, Any]:
+    return {"id": f"{kind}:{source}#{seq}", "source": source, "kind": kind, "title": title, "text": text}
+
+
+def chunks_from_pdfs(docs: Iterable[Dict[str, Any]], size: int = CHUNK_CHARS) -> List[Dict[str, Any]]:
+    """canvas_parser.load_all_texts_from_folder output -> chunks, page by page when pages are given."""
+    out: List[Dict[str, Any]] = []
+    for d in docs:
+        pages = [(f"{d['filename']} p. {n}", p) for n, p in enumerate(d["pages"], 1)] if d.get("pages") else [(d["filename"], d["content"])]
+        seq = 0
+        for title, text in pages:
+            for t in chunk_text(text, size):
+                out.append(_chunk(d["filename"], "pdf", title, t, seq)); seq += 1
+    return out
+
+
+def chunks_from_ppts(decks: Iterable[Dict[str, str]], size: int = CHUNK_CHARS) -> List[Dict[str, Any]]:
+    """ppt_parser.load_all_ppts output -> one chunk per slide (long slides split further)."""
+    out: List[Dict[str, Any]] = []
+    for d in decks:
+        parts = _SLIDE.split(d["content"])  # [before, n, name, body, n, name, body, ...]
+        slides = [(f"{d['filename']} slide {parts[i]}", parts[i + 2]) for i in range(1, len(parts) - 2, 3)] or [(d["filename"], d["content"])]
+        seq = 0
+        for title, body in slides:
+            for t in chunk_text(body, size):
+                out.append(_chunk(d["filename"], "ppt", title, t, seq)); seq += 1
+    return out
+
+
+def chunks_from_json(blocks: Iterable[str], size: int = CHUNK_CHARS) -> List[Dict[str, Any]]:
+    """json_parser.load_json_from_folder output ("📘 course" header lines followed by "• item" lines)
+    -> chunks of consecutive items of one course."""
+    courses: List[Tuple[str, List[str]]] = []
+    for line in blocks:
+        if line.startswith("📘 ") or not courses:
+            courses.append((line[2:].strip() if line.startswith("📘 ") else "Unknown Course", []))
+            if line.startswith("📘 "): continue
+        courses[-1][1].append(line)
+    out: List[Dict[str, Any]] = []
+    for name, items in courses:
+        out += [_chunk(name, "json", name, t, i) for i, t in enumerate(chunk_text("\n\n".join(items), size))]
+    return out
+
+
+# ---------------- BM25 ----------------
+class BM25Index:
+    """Okapi BM25 over an inverted index (term -> [(chunk, tf)]), so a query only touches the
+    postings of its own terms."""
+    def __init__(self, chunks: List[Dict[str, Any]], k1: float = BM25_K1, b: float = BM25_B) -> None:
+        self.chunks = chunks
+        self.k1, self.b = k1, b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.lengths: List[int] = []
+        for i, c in enumerate(chunks):
+            terms = Counter(tokenize(c["title"] + " " + c["text"]))
+            self.lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self.postings.setdefault(term, []).append((i, tf))
+        n = len(chunks)
+        self.avg_len = (sum(self.lengths) / n) if n else 0.0
+        self.idf = {t: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for t, p in self.postings.items()}
+        self.norms = [k1 * (1 - b + b * length / (self.avg_len or 1.0)) for length in self.lengths]
+
+    def term_scores(self, term: str) -> List[Tuple[int, float]]:
+        """(chunk index, BM25 contribution) of one query term."""
+        idf = self.idf.get(term)
+        if idf is None: return []
+        k1, norms = self.k1, self.norms
+        return [(i, idf * tf * (k1 + 1) / (tf + norms[i])) for i, tf in self.postings[term]]
+
+    def search(self, query: str, k: int = CHAT_TOP_K) -> List[Tuple[int, float]]:
+        """Top k (chunk index, score), best first."""
+        return self.search_many([query], k)[0]
+
+    def search_many(self, queries: List[str], k: int = CHAT_TOP_K) -> List[List[Tuple[int, float]]]:
+        """search() for each query; a term shared by several queries is scored once."""
+        terms = [set(tokenize(q)) for q in queries]
+        contrib = {t: self.term_scores(t) for t in set().union(*terms)}
+        out = []
+        for qterms in terms:
+            scores: Dict[int, float] = {}
+            for t in qterms:
+                for i, v in contrib[t]:
+                    scores[i] = scores.get(i, 0.0) + v
+            out.append(heapq.nsmallest(k, scores.items(), key=lambda kv: (-kv[1], kv[0])))
+        return out
+
+
+# ---------------- Retriever ----------------
+class Retriever:
+    """BM25 over all chunks, optionally fused (reciprocal rank) with an embedding index that has
+    search_many(queries, k) -> [[(chunk index, score)]] over the same chunk list."""
+    def __init__(self, chunks: List[Dict[str, Any]], dense: Optional[Any] = None) -> None:
+        self.chunks = chunks
+        self.bm25 = BM25Index(chunks)
+        self.dense = dense
+        for c in chunks:  # rendered once per chunk (chunks of unchanged documents keep theirs across reloads)
+            if "tokens" not in c:
+                c["block"] = f"[{c['title']}]\n{c['text']}"
+                c["tokens"] = count_tokens(c["block"])
+        self.sep_tokens = count_tokens("\n\n")
+
+    def search(self, query: str, k: int = CHAT_TOP_K) -> List[Dict[str, Any]]:
+        return self.search_many([query], k)[0]
+
+    def search_many(self, queries: List[str], k: int = CHAT_TOP_K) -> List[List[Dict[str, Any]]]:
+        """Top k chunks for each query, in one pass over the BM25 postings (and one matrix product
+        for the embedding index)."""
+        if not queries: return []
+        lexical = self.bm25.search_many(queries, k * 2 if self.dense else k)
+        dense = self.dense.search_many(queries, k * 2) if self.dense is not None else None
+        out = []
+        for q, ranked in enumerate(lexical):
+            if dense is not None:
+                fused: Dict[int, float] = {}
+                for hits in (ranked, dense[q]):
+                    for rank, (i, _) in enumerate(hits):
+                        fused[i] = fused.get(i, 0.0) + 1.0 / (RRF_K + rank + 1)
+                ranked = sorted(fused.items(), key=lambda kv: (-kv[1], kv[0]))
+            out.append([{**self.chunks[i], "pos": i, "score": round(s, 4)} for i, s in ranked[:k]])
+        return out
+
+    def context_for(self, query: str, k: int = CHAT_TOP_K, budget: int = CONTEXT_TOKENS) -> Tuple[str, List[Dict[str, Any]], Dict[str, Any]]:
+        """(context, chunks used, token accounting). Whole chunks are taken best first while they fit in
+        budget tokens, then sent in corpus order: questions that retrieve overlapping chunks get the same
+        prompt prefix, which the provider's prompt cache can reuse."""
+        return self.pack(self.search(query, k), budget)
+
+    def contexts_for(self, queries: List[str], k: int = CHAT_TOP_K, budget: int = CONTEXT_TOKENS) -> List[Tuple[str, List[Dict[str, Any]], Dict[str, Any]]]:
+        """context_for() of each query. Queries that pack the same chunks get the same context string object."""
+        shared: Dict[Tuple[int, ...], str] = {}
+        out = []
+        for hits in self.search_many(queries, k):
+            text, picked, usage = self.pack(hits, budget)
+            text = shared.setdefault(tuple(c["pos"] for c in picked), text)
+            out.append((text, picked, usage))
+        return out
+
+    def pack(self, hits: List[Dict[str, Any]], budget: int = CONTEXT_TOKENS) -> Tuple[str, List[Dict[str, Any]], Dict[str, Any]]:
+        picked: List[Dict[str, Any]] = []
+        used = skipped = 0
+        for c in hits:
+            cost = c["tokens"] + (self.sep_tokens if picked else 0)
+            if used + cost > budget:
+                skipped += 1; continue
+            picked.append(c); used += cost
+        picked.sort(key=lambda c: c["pos"])
+        return "\n\n".join(c["block"] for c in picked), picked, {
+            "context_tokens": used, "budget": budget, "chunks_used": len(picked), "chunks_skipped": skipped}
+
+    def stats(self) -> Dict[str, Any]:
+        kinds = Counter(c["kind"] for c in self.chunks)
+        return {"chunks": len(self.chunks), "by_kind": dict(kinds), "terms": len(self.bm25.postings),
+                "chars": sum(len(c["text"]) for c in self.chunks), "tokens": sum(c["tokens"] for c in self.chunks),
+                "dense": self.dense is not None}
@@ -0,0 +1,54 @@
+import os
+import json
+import tempfile
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+from storage import private_dir
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR") or os.path.join(tempfile.gettempdir(), "canvas_snapshots")
+
+
+def stamp(obj: Dict[str, Any]) -> Optional[str]:
+    """Version marker Canvas gives an object: updated_at, or modified_at for files."""
+    return obj.get("updated_at") or obj.get("modified_at")
+
+
+def diff_stamps(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, int]:
+    """Count added / changed / removed / unchanged keys between two {key: stamp} maps.
+    Objects Canvas gives no timestamp for cannot be compared and are counted as untracked."""
+    added = sum(1 for k in new if k not in old)
+    removed = sum(1 for k in old if k not in new)
+    untracked = sum(1 for k, v in new.items() if k in old and v is None)
+    changed = sum(1 for k, v in new.items() if k in old and v is not None and old[k] != v)
+    return {"added": added, "changed": changed, "removed": removed, "untracked": untracked,
+            "unchanged": len(new) - added - changed - untracked}
+
+
+class SnapshotStore:
+    """Last-seen state of each course, one JSON file per (api_base, user, course)."""
+    def __init__(self, root: str = SNAPSHOT_DIR) -> None:
+        self.root = root
+        self.lock = threading.Lock()
+        private_dir(root)
+
+    def _path(self, api_base: str, user_id: Any, course_id: Any) -> str:
+        key = hashlib.sha256(f"{api_base.rstrip('/')}|{user_id}|{course_id}".encode()).hexdigest()
+        return os.path.join(self.root, key + ".json")
+
+    def load(self, api_base: str, user_id: Any, course_id: Any) -> Dict[str, Any]:
+        """Previous snapshot, or {} when the course has never been exported."""
+        try:
+            with open(self._path(api_base, user_id, course_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self, api_base: str, user_id: Any, course_id: Any, snapshot: Dict[str, Any]) -> None:
+        path = self._path(api_base, user_id, course_id)
+        with self.lock:
+            tmp = path + ".part"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp, path)
@@ -0,0 +1,10 @@
+import os
+
+
+def private_dir(path: str) -> str:
+    """Create path if needed and make it owner-only (0700): the caches and export artifacts kept
+    under it hold course content. An existing directory, e.g. one an older version created 0755,
+    is tightened too."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    os.chmod(path, 0o700)
+    return path
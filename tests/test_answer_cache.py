@@ -0,0 +1,66 @@
+import asyncio
+
+from answer_cache import ANSWER_CACHE_SIMILARITY, AnswerCache
+
+
+def _cache(similarity=0.85):
+    return AnswerCache(similarity=similarity)
+
+
+def test_exact_only_by_default():
+    assert ANSWER_CACHE_SIMILARITY == 0
+    cache = AnswerCache()
+    cache.store("What is the due date for lab 2?", "v1", "Friday")
+    assert cache.lookup("what is the due date for Lab 2", "v1") == ("hit", "Friday")
+    assert cache.lookup("Please tell me the due date for lab 2", "v1") == (None, None)
+
+
+def test_similar_question_reuses_answer():
+    cache = _cache()
+    cache.store("What is the due date for lab 2?", "v1", "Friday")
+    assert cache.lookup("Please tell me the due date for lab 2", "v1") == ("similar", "Friday")
+    assert cache.lookup("Please tell me the due date for lab 2", "v2") == (None, None)
+
+
+def test_reversed_comparison_is_not_similar():
+    cache = _cache(0.01)
+    cache.store("Is Assignment 3 worth more than assignment 4?", "v1", "No")
+    assert cache.lookup("Is Assignment 4 worth more than assignment 3?", "v1") == (None, None)
+
+
+def test_reordered_words_are_not_similar():
+    cache = _cache(0.5)
+    cache.store("Does the quiz come before the lecture on cells?", "v1", "Yes")
+    assert cache.lookup("Does the lecture come before the quiz on cells?", "v1") == (None, None)
+
+
+def test_different_numbers_are_not_similar():
+    cache = _cache(0.01)
+    asked = "What are the grading criteria and the submission requirements for the written report of lab {}?"
+    cache.store(asked.format(1), "v1", "Rubric for lab 1")
+    assert cache.lookup(asked.format(2), "v1") == (None, None)
+    assert cache.lookup(asked.format(1).replace("What are", "Tell me"), "v1") == ("similar", "Rubric for lab 1")
+
+
+def test_different_ordinals_are_not_similar():
+    cache = _cache(0.01)
+    cache.store("When is the second midterm exam scheduled this semester?", "v1", "March")
+    assert cache.lookup("When is the third midterm exam scheduled this semester?", "v1") == (None, None)
+
+
+def test_get_or_compute_coalesces():
+    cache = AnswerCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_compute("Same question?", "v1", compute) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert sorted(how for _, how in results) == ["coalesced"] * 4 + ["miss"]
+    assert asyncio.run(cache.get_or_compute("same question", "v1", compute)) == ("answer", "hit")
@@ -0,0 +1,56 @@
+import json
+import os
+import shutil
+import time
+
+from blob_cache import BlobCache
+
+
+def _file(tmp_path, name, data):
+    p = tmp_path / "downloads" / name
+    p.parent.mkdir(exist_ok=True)
+    p.write_bytes(data)
+    return str(p)
+
+
+def test_workers_share_entries(tmp_path):
+    root = str(tmp_path / "cache")
+    a, b = BlobCache(root), BlobCache(root)  # two uvicorn workers on one host
+    a.adopt("h:1:v1:3", _file(tmp_path, "one", b"abc"))
+    b.adopt("h:2:v1:3", _file(tmp_path, "two", b"xyz"))
+    assert b.materialize("h:1:v1:3", str(tmp_path / "out" / "one"))
+    assert a.materialize("h:2:v1:3", str(tmp_path / "out" / "two"))
+    assert (tmp_path / "out" / "one").read_bytes() == b"abc"
+    assert not a.materialize("h:3:v1:3", str(tmp_path / "out" / "three"))
+    assert BlobCache(root).stats()["blobs"] == 2
+
+
+def test_same_bytes_stored_once(tmp_path):
+    cache = BlobCache(str(tmp_path / "cache"))
+    cache.adopt("h:1:v1:3", _file(tmp_path, "one", b"abc"))
+    cache.adopt("h:2:v1:3", _file(tmp_path, "two", b"abc"))
+    assert cache.stats()["blobs"] == 1 and cache.stats()["bytes"] == 3
+
+
+def test_least_recently_used_evicted(tmp_path):
+    cache = BlobCache(str(tmp_path / "cache"), max_bytes=25)
+    for n in range(3):
+        cache.adopt(f"h:{n}:v1:10", _file(tmp_path, str(n), bytes([n]) * 10))
+        time.sleep(0.01)
+    assert not cache.materialize("h:0:v1:10", str(tmp_path / "out" / "0"))
+    assert cache.materialize("h:2:v1:10", str(tmp_path / "out" / "2"))
+    assert cache.stats()["bytes"] <= 25
+    keys = [f for _, _, files in os.walk(tmp_path / "cache" / "keys") for f in files]
+    assert len(keys) == 2  # the evicted blob's key went with it
+
+
+def test_legacy_index_imported(tmp_path):
+    root = tmp_path / "cache"
+    cache = BlobCache(str(root))
+    cache.adopt("h:1:v1:3", _file(tmp_path, "one", b"abc"))
+    sha = next(f for _, _, files in os.walk(root / "blobs") for f in files)
+    shutil.rmtree(root / "keys")
+    (root / "index.json").write_text(json.dumps({"keys": {"h:1:v1:3": sha}, "blobs": {sha: {"size": 3, "used": 0}}}))
+    cache = BlobCache(str(root))
+    assert not (root / "index.json").exists()
+    assert cache.materialize("h:1:v1:3", str(tmp_path / "out" / "one"))
@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+
+import main
+from chat_context import ChatContext
+from retrieval import Retriever
+
+CHUNKS = [{"id": f"json:Bio#{i}", "source": "Bio", "kind": "json", "title": f"Lab {i}", "text": f"Lab {i} is due on day {i}."}
+          for i in range(1, 6)]
+
+
+@pytest.fixture(autouse=True)
+def fresh(monkeypatch):
+    monkeypatch.setattr(main, "answers", main.AnswerCache())
+    monkeypatch.setattr(main, "llm", main.make_llm("fake"))
+    main.llm.backend.delay = 0
+
+
+class SlowDense:
+    """An embedding index whose query embedding blocks like a remote call."""
+    def search_many(self, queries, k):
+        time.sleep(0.2)
+        return [[(0, 1.0)] for _ in queries]
+
+
+def _ticks_during(coro):
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        t = asyncio.create_task(ticker())
+        result = await coro()
+        t.cancel()
+        return ticks, result
+    return asyncio.run(run())
+
+
+def test_retrieval_does_not_block_event_loop():
+    retriever = Retriever([dict(c) for c in CHUNKS], SlowDense())
+    ticks, result = _ticks_during(lambda: main.answer_question("When is lab 2 due?", retriever, "v1"))
+    assert result["cache"] == "miss" and result["sources"]
+    assert ticks >= 5
+
+
+def test_stream_retrieval_does_not_block_event_loop():
+    retriever = Retriever([dict(c) for c in CHUNKS], SlowDense())
+
+    async def consume():
+        return [e async for e in main.stream_answer("When is lab 2 due?", retriever, "v1")]
+
+    ticks, events = _ticks_during(consume)
+    assert events[0].startswith("event: sources") and events[-1].startswith("event: done")
+    assert ticks >= 5
+
+
+def _course_dir(tmp_path, day):
+    folder = tmp_path / "json"
+    folder.mkdir(exist_ok=True)
+    (folder / "bio.json").write_text(
+        '{"name": "Bio", "assignments": [{"name": "Lab 2", "description": "Due on %s"}]}' % day, encoding="utf-8")
+    return {"json": (str(folder), "*.json")}
+
+
+def test_answer_is_cached_under_the_version_it_was_built_from(tmp_path, monkeypatch):
+    dirs = _course_dir(tmp_path, "Friday")
+    ctx = ChatContext(dirs)
+    ctx.reload()
+    monkeypatch.setattr(main, "context", ctx)
+    old = ctx.current
+
+    async def run():
+        stream = main.stream_answer("When is lab 2 due?", old.retriever, old.fingerprint)
+        first = await stream.__anext__()
+        _course_dir(tmp_path, "Tuesday")  # the corpus changes while the answer is being generated
+        ctx.reload(force=True)
+        return [first] + [e async for e in stream]
+
+    events = asyncio.run(run())
+    assert "Friday" in "".join(events)
+    new = ctx.current
+    assert new.fingerprint != old.fingerprint and new.version == old.version + 1
+    assert main.answers.lookup("When is lab 2 due?", old.fingerprint)[0] == "hit"
+    assert main.answers.lookup("When is lab 2 due?", new.fingerprint) == (None, None)
+    assert ctx.status()["fingerprint"] == new.fingerprint
@@ -0,0 +1,50 @@
+import asyncio
+
+import httpx
+import pytest
+
+import app
+
+DATA = b"0123456789abcdef"
+
+
+def serve(monkeypatch, answer):
+    """Route app's HTTP client to answer(range_start or None) -> (status, headers, body); returns the Range headers seen."""
+    seen = []
+
+    def handler(request):
+        rng = request.headers.get("Range")
+        seen.append(rng)
+        start = int(rng[6:-1]) if rng else None
+        status, headers, body = answer(start)
+        return httpx.Response(status, headers=headers, content=body)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(app, "async_http_client", lambda: client)
+    return seen
+
+
+def download(path):
+    asyncio.run(app.adownload_file_to(str(path), "https://files.example.com/f", {}))
+
+
+def test_resume_appends_matching_range(tmp_path, monkeypatch):
+    (tmp_path / "f.part").write_bytes(DATA[:5])
+    seen = serve(monkeypatch, lambda start: (206, {"Content-Range": f"bytes {start}-{len(DATA) - 1}/{len(DATA)}"}, DATA[start:]))
+    download(tmp_path / "f")
+    assert (tmp_path / "f").read_bytes() == DATA
+    assert seen == ["bytes=5-"]
+
+
+@pytest.mark.parametrize("content_range", ["bytes 0-15/16", "bytes 3-15/16", "", "garbage"])
+def test_resume_with_other_range_restarts(tmp_path, monkeypatch, content_range):
+    (tmp_path / "f.part").write_bytes(DATA[:5])
+
+    def answer(start):
+        if start is None: return 200, {}, DATA
+        return 206, {"Content-Range": content_range} if content_range else {}, DATA
+    seen = serve(monkeypatch, answer)
+    download(tmp_path / "f")
+    assert (tmp_path / "f").read_bytes() == DATA
+    assert seen == ["bytes=5-", None]
+    assert not (tmp_path / "f.part").exists()
@@ -0,0 +1,64 @@
+import os
+import time
+import zipfile
+
+import pytest
+
+import app
+from export_jobs import JobManager
+from mock_canvas import MockCanvas, start_background
+
+
+@pytest.fixture(scope="module")
+def canvas():
+    mock = MockCanvas(courses=2, assignments=5, pages=3, files=2, discussions=1, quizzes=1, modules=1,
+                      items_per_module=3, body_bytes=100, file_bytes=1000, latency_ms=0)
+    server, api_base = start_background(mock)
+    yield api_base
+    server.should_exit = True
+
+
+def test_export_job_runs_on_the_async_pipeline(canvas, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "export_jobs", JobManager(root=str(tmp_path)))
+    opts = app._export_options({"api_base": canvas, "token": "t", "download_all_files": True, "timings": True})
+    job = app.export_jobs.submit(opts["token"], lambda job: app.run_export_job(job, opts))
+    deadline = time.time() + 30
+    while job.status in ("queued", "running") and time.time() < deadline:
+        time.sleep(0.05)
+    assert job.status == "done", job.error
+    with zipfile.ZipFile(job.path) as z:
+        names = z.namelist()
+    assert sum(n.endswith(".json") and "/" not in n for n in names) == 4  # 2 courses, index, timings
+    assert sum("_files/" in n for n in names) == 4
+    assert job.progress["courses_total"] == 2 and job.progress["courses_done"] == 2
+    assert job.timings["counters"] and "collect_course" in job.timings["phases"]
+
+
+def _run(opts):
+    job = app.export_jobs.submit(opts["token"], lambda job: app.run_export_job(job, opts))
+    deadline = time.time() + 30
+    while job.status in ("queued", "running") and time.time() < deadline:
+        time.sleep(0.05)
+    return job
+
+
+def test_snapshots_saved_only_once_the_archive_is_complete(canvas, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "export_jobs", JobManager(root=str(tmp_path / "jobs")))
+    monkeypatch.setattr(app, "snapshots", app.SnapshotStore(str(tmp_path / "snapshots")))
+    opts = app._export_options({"api_base": canvas, "token": "t", "download_all_files": True, "incremental": True})
+    dirname = app.course_files_dirname
+    calls = []
+
+    def second_course_fails(course_obj):
+        calls.append(course_obj)
+        if len(calls) == 2: raise RuntimeError("boom")
+        return dirname(course_obj)
+
+    monkeypatch.setattr(app, "course_files_dirname", second_course_fails)
+    job = _run(opts)
+    assert job.status == "error"
+    assert os.listdir(tmp_path / "snapshots") == []  # course 1's files never reached a finished ZIP
+
+    monkeypatch.setattr(app, "course_files_dirname", dirname)
+    assert _run(opts).status == "done"
+    assert len(os.listdir(tmp_path / "snapshots")) == 2
@@ -0,0 +1,31 @@
+import pytest
+from fastapi import HTTPException
+
+import app
+
+BASE = {"api_base": "https://canvas.example.com/api/v1", "token": "t"}
+
+
+def test_defaults():
+    opts = app._export_options(BASE)
+    assert opts["stored_exts"] == app.ZIP_STORED_EXTS
+    assert opts["workers"] == app.EXPORT_WORKERS
+
+
+def test_stored_extensions_normalized():
+    opts = app._export_options({**BASE, "zip_stored_extensions": [".PDF", "mp4"]})
+    assert opts["stored_exts"] == {"pdf", "mp4"}
+    assert app._export_options({**BASE, "zip_stored_extensions": []})["stored_exts"] == set()
+
+
+@pytest.mark.parametrize("bad", [None, "pdf", 3, {"pdf": True}, ["pdf", 1], [None]])
+def test_stored_extensions_must_be_a_list_of_strings(bad):
+    with pytest.raises(HTTPException) as e:
+        app._export_options({**BASE, "zip_stored_extensions": bad})
+    assert e.value.status_code == 400
+
+
+def test_missing_credentials():
+    with pytest.raises(HTTPException) as e:
+        app._export_options({"api_base": BASE["api_base"]})
+    assert e.value.status_code == 400
@@ -0,0 +1,21 @@
+import asyncio
+
+import app
+
+
+def test_pool_covers_export_fan_out(monkeypatch):
+    monkeypatch.setattr(app, "HTTP_POOL_SIZE", 0)
+    assert app.http_pool_size() >= app.EXPORT_WORKERS * app.SECTION_WORKERS * app.PAGE_WORKERS
+    monkeypatch.setattr(app, "HTTP_POOL_SIZE", 12)
+    assert app.http_pool_size() == 12
+
+
+def test_async_client_keeps_the_pool_alive():
+    async def limits():
+        try:
+            return app.async_http_client()._transport._pool
+        finally:
+            await app.aclose_http_client()
+    pool = asyncio.run(limits())
+    assert pool._max_keepalive_connections == app.http_pool_size()
+    assert pool._max_connections == app.http_pool_size() * app.HTTP_POOL_HOSTS
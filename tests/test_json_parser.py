@@ -0,0 +1,142 @@
+import io
+import json
+import random
+
+import pytest
+
+from extraction import TextCache, extract_many
+from json_parser import JsonStream, html_to_text, iter_course_records, load_json_file, load_json_files
+
+
+# ---------------- html_to_text ----------------
+@pytest.mark.parametrize("html, text", [
+    ("", ""),
+    (None, ""),
+    ("plain", "plain"),
+    ("<p>one</p><p>two</p>", "one\ntwo"),
+    ("a<br/>b", "a\nb"),
+    ("a <b>bold</b> c", "a bold c"),
+    ("a<\n>b", "ab"),
+    ("a<\t>b", "ab"),
+    ("a< >b", "ab"),
+    ("a<>b", "ab"),
+    ("a</>b", "ab"),
+    ("a</ \n>b", "ab"),
+    ("x<script>var s = '<p>';</script>y", "xy"),
+    ("x<style>p { }</style>y", "xy"),
+    ("x<!-- <p> -->y", "xy"),
+    ("x<!-- never closed", "x"),
+    ("3 < 4", "3 < 4"),
+    ("Q&amp;A &lt;p&gt;", "Q&A <p>"),
+    ("<div>  spaced   out  </div>", "spaced out"),
+])
+def test_html_to_text(html, text):
+    assert html_to_text(html) == text
+
+
+# ---------------- JsonStream ----------------
+def _random_value(rng, depth=0):
+    pick = rng.randrange(8 if depth < 3 else 5)
+    if pick == 0: return rng.choice([None, True, False])
+    if pick == 1: return rng.randint(-10**6, 10**6)
+    if pick == 2: return rng.choice([-2500.0, 0.5, 1e-7, 3.25e10])
+    if pick in (3, 4): return "".join(rng.choice('ab "\\/\n\té€{}[],:') for _ in range(rng.randrange(12)))
+    if pick == 5: return [_random_value(rng, depth + 1) for _ in range(rng.randrange(5))]
+    return {f"k{i}": _random_value(rng, depth + 1) for i in range(rng.randrange(5))}
+
+
+def _walk(r):
+    """Rebuild a value through items()/members(), skipping every third member."""
+    c = r.peek()
+    if c == "[":
+        return [_walk(r) for _ in r.items()]
+    if c == "{":
+        out = {}
+        for n, key in enumerate(r.members()):
+            if n % 3 == 2:
+                r.skip()
+                out[key] = "<skipped>"
+            else:
+                out[key] = _walk(r)
+        return out
+    return r.value()
+
+
+def _expected(v):
+    if isinstance(v, list): return [_expected(x) for x in v]
+    if isinstance(v, dict): return {k: "<skipped>" if n % 3 == 2 else _expected(x) for n, (k, x) in enumerate(v.items())}
+    return v
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, 64, 1 << 16])
+def test_json_stream_buffer_sizes(size):
+    rng = random.Random(size)
+    for _ in range(40):
+        doc = {"name": "Course", "items": [_random_value(rng) for _ in range(4)], "n": -2500.0}
+        for text in (json.dumps(doc), json.dumps(doc, indent=2, ensure_ascii=False)):
+            assert _walk(JsonStream(io.StringIO(text), size)) == _expected(doc)
+
+
+@pytest.mark.parametrize("size", [1, 5, 1 << 16])
+def test_json_stream_number_at_buffer_edge(size):
+    r = JsonStream(io.StringIO('[-2500.0, 12e3, 7]'), size)
+    assert [r.value() for _ in r.items()] == [-2500.0, 12000.0, 7]
+
+
+def test_json_stream_errors():
+    with pytest.raises(ValueError):
+        list(JsonStream(io.StringIO('{"a" 1}'), 4).members())
+    r = JsonStream(io.StringIO('["unterminated'), 4)
+    with pytest.raises(ValueError):
+        for _ in r.items(): r.skip()
+
+
+# ---------------- Course files ----------------
+def _course(tmp_path, data, name="course.json"):
+    path = tmp_path / name
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return path
+
+
+def test_iter_course_records(tmp_path):
+    path = _course(tmp_path, {
+        "name": "Biology",
+        "assignments": [{"name": "Lab 1", "description": "<p>Due\n</p><\n>Friday"}, "not an object"],
+        "pages": [{"title": "Syllabus", "body": "<h1>Week 1</h1>cells"}],
+        "modules": [{"name": "Unit 1", "items": [{"title": "Intro", "type": "Page", "page": {"body": "x"}}, 3]}],
+        "files": [{"display_name": "ignored"}],
+    })
+    assert list(iter_course_records(path)) == [
+        {"kind": "course", "title": "Biology", "text": ""},
+        {"kind": "assignment", "title": "Lab 1", "text": "Due\nFriday"},
+        {"kind": "page", "title": "Syllabus", "text": "Week 1\ncells"},
+        {"kind": "module_item", "title": "Unit 1 / Intro", "text": "Page"},
+    ]
+
+
+def test_failed_parse_is_not_cached(tmp_path):
+    good = _course(tmp_path, {"name": "Good", "assignments": [{"name": "A", "description": "<\t>ok"}]}, "good.json")
+    bad = tmp_path / "bad.json"
+    bad.write_text('{"name": "Bad", "assignments": [', encoding="utf-8")
+    cache = TextCache(str(tmp_path / "cache"))
+
+    results = extract_many("json", [str(good), str(bad)], load_json_file, workers=1, cache=cache)
+    assert [(parts, err is None) for _, parts, err in results] == [(["📘 Good", "• A: ok"], True), (None, False)]
+    assert cache.get("json", str(good)) == ["📘 Good", "• A: ok"]
+    assert cache.get("json", str(bad)) is None
+    assert load_json_files([good, bad])[1] == []
+
+
+def test_parser_processes_are_shared_and_not_forked(tmp_path):
+    import extraction
+    paths = []
+    for n in range(3):
+        p = tmp_path / f"c{n}.json"
+        p.write_text(json.dumps({"name": f"Course {n}"}), encoding="utf-8")
+        paths.append(str(p))
+    first = extract_many("json", paths, load_json_file, workers=2, cache=None)
+    pool = extraction._pool
+    assert [blocks for _, blocks, _ in first] == [[f"📘 Course {n}"] for n in range(3)]
+    assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+    extract_many("json", paths, load_json_file, workers=2, cache=None)
+    assert extraction._pool is pool
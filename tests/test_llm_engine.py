@@ -0,0 +1,28 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import llm_engine
+from llm_engine import FakeBackend, make_llm
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_needs_no_api_key():
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    env.update({"LLM_BACKEND": "fake", "OPENAI_API_KEY": ""})
+    done = subprocess.run([sys.executable, "-c", "import main, llm_engine; assert llm_engine._client is None"],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    assert done.returncode == 0, done.stderr
+
+
+def test_fake_backend_answers_with_usage():
+    llm = make_llm("fake")
+    llm.backend.delay = 0
+    usage = {}
+    answer = asyncio.run(llm.ask("When is lab 2 due?", "[Lab 2]\nDue Friday", usage))
+    assert answer.startswith("Answer to 'When is lab 2 due?'")
+    assert isinstance(llm.backend, FakeBackend) and llm.backend.calls == 1
+    assert usage["prompt_tokens"] > 0 and usage["completion_tokens"] > 0
+    assert llm_engine._client is None
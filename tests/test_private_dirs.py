@@ -0,0 +1,50 @@
+import os
+import stat
+import time
+
+import pytest
+
+from blob_cache import BlobCache
+from embedding_store import EmbeddingStore, HashEmbedder
+from export_jobs import JobManager
+from extraction import TextCache
+from response_cache import DiskBackend
+from snapshot_store import SnapshotStore
+
+STORES = {
+    "jobs": lambda root: JobManager(workers=1, root=root).pool.shutdown(),
+    "blobs": lambda root: BlobCache(root=root),
+    "snapshots": SnapshotStore,
+    "responses": DiskBackend,
+    "extracted": TextCache,
+    "embeddings": lambda root: EmbeddingStore(HashEmbedder(dim=8), root=root),
+}
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+@pytest.mark.parametrize("name", sorted(STORES))
+def test_created_owner_only(tmp_path, name):
+    root = str(tmp_path / name)
+    STORES[name](root)
+    assert mode(root) == 0o700
+
+
+@pytest.mark.parametrize("name", sorted(STORES))
+def test_existing_directory_tightened(tmp_path, name):
+    root = tmp_path / name
+    root.mkdir(mode=0o755)
+    os.chmod(root, 0o755)
+    STORES[name](str(root))
+    assert mode(root) == 0o700
+
+
+def test_job_manager_removes_expired_files_of_earlier_runs(tmp_path):
+    now = time.time()
+    for name, age in (("old.zip", 7200), ("old.zip.part", 7200), ("recent.zip", 60), ("writing.zip.part", 1)):
+        (tmp_path / name).write_bytes(b"x")
+        os.utime(tmp_path / name, (now - age, now - age))
+    JobManager(workers=1, ttl=3600, root=str(tmp_path)).pool.shutdown()
+    assert sorted(os.listdir(tmp_path)) == ["recent.zip", "writing.zip.part"]
@@ -0,0 +1,51 @@
+import asyncio
+
+import app
+from app import RateGovernor
+
+
+class Resp:
+    def __init__(self, remaining, cost=1.0):
+        self.headers = {"X-Rate-Limit-Remaining": str(remaining), "X-Request-Cost": str(cost)}
+
+
+def _admitted(g):
+    """Requests the governor lets open at once without waiting."""
+    n = 0
+    with g.lock:
+        while g._delay() == 0:
+            g._admit(0.0)
+            n += 1
+            if n > 1000: break
+    return n
+
+
+def test_concurrency_capped_before_quota_is_known(monkeypatch):
+    monkeypatch.setattr(app, "RATE_UNKNOWN_CONCURRENCY", 4)
+    g = RateGovernor()
+    assert _admitted(g) == 4
+    with g.lock:
+        assert 0 < g._delay() <= app.RATE_RELEASE_POLL
+
+
+def test_preflight_reserved_per_request_in_flight(monkeypatch):
+    monkeypatch.setattr(app, "RATE_PREFLIGHT_COST", 50.0)
+    monkeypatch.setattr(app, "RATE_LOW_WATER", 150.0)
+    g = RateGovernor()
+    asyncio.run(g.acquire_async()); g.release(Resp(700))
+    # 700 units, 150 kept back, 50 held by each open request
+    assert _admitted(g) == 11
+    with g.lock:
+        assert 0 < g._delay() <= app.RATE_RELEASE_POLL  # only the reservations hold the next one back
+    g.release(Resp(700))
+    with g.lock:
+        assert g._delay() == 0
+
+
+def test_low_quota_waits_for_refill(monkeypatch):
+    monkeypatch.setattr(app, "RATE_PREFLIGHT_COST", 50.0)
+    monkeypatch.setattr(app, "RATE_LOW_WATER", 150.0)
+    g = RateGovernor()
+    asyncio.run(g.acquire_async()); g.release(Resp(100))
+    with g.lock:
+        assert g._delay() > 1.0
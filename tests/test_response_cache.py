@@ -0,0 +1,45 @@
+import asyncio
+import threading
+
+import httpx
+
+import app
+from response_cache import DiskBackend, MemoryBackend, ResponseCache
+
+
+def _threads(backend):
+    """Wrap backend get/put/restamp to record the thread each call runs on."""
+    seen = []
+    for name in ("get", "put", "restamp"):
+        fn = getattr(backend, name)
+        setattr(backend, name, lambda *a, fn=fn, name=name: (seen.append((name, threading.current_thread())), fn(*a))[1])
+    return seen
+
+
+def _fetch_twice(monkeypatch, backend):
+    monkeypatch.setattr(app, "response_cache", ResponseCache(backend, ttls=[], default_ttl=0))
+    handler = lambda request: (httpx.Response(304) if request.headers.get("If-None-Match")
+                               else httpx.Response(200, headers={"ETag": "v1"}, json=[1, 2]))
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(app, "async_http_client", lambda: client)
+
+    async def run():
+        first = await app._aget("https://canvas.example.com/api/v1/courses", {"Authorization": "Bearer t"})
+        second = await app._aget("https://canvas.example.com/api/v1/courses", {"Authorization": "Bearer t"})
+        return first.json(), second.json()
+    return asyncio.run(run())
+
+
+def test_disk_backend_runs_off_the_event_loop(tmp_path, monkeypatch):
+    backend = DiskBackend(str(tmp_path))
+    seen = _threads(backend)
+    assert _fetch_twice(monkeypatch, backend) == ([1, 2], [1, 2])
+    assert {name for name, _ in seen} == {"get", "put", "restamp"}
+    assert all(t is not threading.main_thread() for _, t in seen)
+
+
+def test_memory_backend_stays_on_the_event_loop(monkeypatch):
+    backend = MemoryBackend()
+    seen = _threads(backend)
+    assert _fetch_twice(monkeypatch, backend) == ([1, 2], [1, 2])
+    assert seen and all(t is threading.main_thread() for _, t in seen)
@@ -0,0 +1,17 @@
+from retrieval import chunks_from_pdfs, chunks_from_ppts
+
+
+def test_long_slide_chunks_get_distinct_ids():
+    long = " ".join(["word"] * 600)  # about 3000 characters: split into several chunks
+    deck = {"filename": "d.pptx", "content": f"📄 Slide 1 (Intro):\n{long}\n📄 Slide 2 (More):\nshort\n"}
+    chunks = chunks_from_ppts([deck], size=1200)
+    ids = [c["id"] for c in chunks]
+    assert len(chunks) > 3 and len(set(ids)) == len(ids)
+    assert ids == [f"ppt:d.pptx#{i}" for i in range(len(ids))]
+
+
+def test_ids_restart_per_document():
+    decks = [{"filename": f"{n}.pptx", "content": "📄 Slide 1 (A):\nsome text\n"} for n in "ab"]
+    assert [c["id"] for c in chunks_from_ppts(decks)] == ["ppt:a.pptx#0", "ppt:b.pptx#0"]
+    docs = [{"filename": f"{n}.pdf", "content": "text", "pages": ["p1", "p2"]} for n in "ab"]
+    assert [c["id"] for c in chunks_from_pdfs(docs)] == ["pdf:a.pdf#0", "pdf:a.pdf#1", "pdf:b.pdf#0", "pdf:b.pdf#1"]
@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# a tiktoken whose encoding download never returns, like a fetch whose packets are dropped
+HANGING_TIKTOKEN = """
+import time
+def encoding_for_model(name): time.sleep(3600)
+def get_encoding(name): time.sleep(3600)
+"""
+
+
+def test_import_and_count_do_not_hang_without_egress(tmp_path):
+    (tmp_path / "tiktoken.py").write_text(HANGING_TIKTOKEN)
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([str(tmp_path), ROOT]), "TOKEN_LOAD_TIMEOUT": "0.5",
+           "LLM_BACKEND": "fake"}
+    code = ("import time; t = time.time(); import main, tokens; assert time.time() - t < 5, 'import blocked'; "
+            "assert tokens._loaded is False; print(tokens.count_tokens('hello world'), tokens.exact())")
+    start = time.time()
+    done = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    assert done.returncode == 0, done.stderr
+    assert done.stdout.split() == ["4", "False"]  # the estimate: 2 words of 5 characters
+    assert time.time() - start < 30
@@ -0,0 +1,35 @@
+import asyncio
+import io
+import os
+import zipfile
+
+import app
+
+
+async def _entries(items):
+    for item in items:
+        yield item
+
+
+def test_zip_built_off_the_event_loop(tmp_path):
+    data = os.urandom(4 * app.ZIP_CHUNK)
+    path = tmp_path / "notes.txt"
+    path.write_bytes(data)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0); ticks += 1
+
+        t = asyncio.ensure_future(ticker())
+        out = b"".join([c async for c in app.astream_zip(_entries([("a.json", b"{}" * 1000), ("notes.txt", str(path))]))])
+        t.cancel()
+        return out, ticks
+
+    out, ticks = asyncio.run(run())
+    with zipfile.ZipFile(io.BytesIO(out)) as z:
+        assert z.read("notes.txt") == data and z.read("a.json") == b"{}" * 1000
+    assert ticks > 4  # the loop ran other tasks while entries were read and deflated
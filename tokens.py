@@ -0,0 +1,62 @@
+import os
+import re
+import math
+import threading
+from typing import Any, List, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+TOKEN_MODEL = os.getenv("LLM_MODEL", "gpt-4o")
+TOKEN_FALLBACK_ENCODING = "o200k_base"
+TOKEN_LOAD_TIMEOUT = float(os.getenv("TOKEN_LOAD_TIMEOUT", "5"))  # seconds to wait for tiktoken's encoding file
+
+_WORD = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def _load_encoder() -> Optional[Any]:
+    """tiktoken's encoder for the model, or None when tiktoken or its encoding file is unavailable."""
+    if tiktoken is None: return None
+    for load in (lambda: tiktoken.encoding_for_model(TOKEN_MODEL), lambda: tiktoken.get_encoding(TOKEN_FALLBACK_ENCODING)):
+        try:
+            return load()
+        except Exception:  # unknown model, or the encoding cannot be downloaded
+            continue
+    return None
+
+
+_encoder: Optional[Any] = None
+_loaded = False
+_lock = threading.Lock()
+
+
+def get_encoder() -> Optional[Any]:
+    """The encoder, loaded on first use rather than at import. On a cold cache tiktoken downloads the
+    encoding file with no timeout; after TOKEN_LOAD_TIMEOUT seconds the estimate is used for the rest
+    of the process, so a host whose egress is dropped still starts."""
+    global _encoder, _loaded
+    if _loaded: return _encoder
+    with _lock:
+        if not _loaded:
+            box: List[Optional[Any]] = []
+            t = threading.Thread(target=lambda: box.append(_load_encoder()), daemon=True, name="tiktoken-load")
+            t.start(); t.join(TOKEN_LOAD_TIMEOUT)
+            _encoder = box[0] if box else None
+            _loaded = True
+    return _encoder
+
+
+def exact() -> bool:
+    """True when counts come from tiktoken rather than the estimate."""
+    return get_encoder() is not None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens of text for the chat model; without tiktoken an estimate that errs on the high side
+    (a word is a token per 4 characters, punctuation a token each)."""
+    if not text: return 0
+    encoder = get_encoder()
+    if encoder is not None: return len(encoder.encode(text, disallowed_special=()))
+    return sum(math.ceil(len(w) / 4) for w in _WORD.findall(text))